@@ -0,0 +1,87 @@
+"""
+評估結果代碼
+
+將 20 題作答壓縮為短小、可放在網址上的代碼（例如 ?r=AQcaZJROomrWBkU），
+讓顧問或回訪的使用者不必重新填寫問卷即可還原結果。
+
+代碼格式（base64url，無補齊字元；解碼時只接受這種唯一的寫法）：
+- 1 byte：問卷版本 (scoring.QUESTIONNAIRE_VERSION)
+- 6 bytes：作答位元；單選題以選項索引編碼（2 選項 1 bit、3-4 選項 2 bits），
+  多選題以每個選項 1 bit 的位元遮罩編碼，共 43 bits
+- 4 bytes：評估時間（Unix 秒數，無號 32 位元）
+"""
+import base64
+from datetime import datetime
+
+from scoring import QUESTIONNAIRE_VERSION, QUESTIONS
+
+
+def _field_bits(options, multi):
+    return len(options) if multi else max(1, (len(options) - 1).bit_length())
+
+
+ANSWER_BITS = sum(_field_bits(options, multi) for _, options, multi in QUESTIONS)
+ANSWER_BYTES = (ANSWER_BITS + 7) // 8
+TIMESTAMP_BYTES = 4
+TOKEN_BYTES = 1 + ANSWER_BYTES + TIMESTAMP_BYTES
+
+
+def pack_answers(answers):
+    """將作答依題目順序壓縮為整數"""
+    packed = 0
+    for key, options, multi in QUESTIONS:
+        bits = _field_bits(options, multi)
+        if multi:
+            selected = set(answers[key])
+            value = sum(1 << i for i, option in enumerate(options) if option in selected)
+        else:
+            value = options.index(answers[key])
+        packed = (packed << bits) | value
+    return packed
+
+
+def unpack_answers(packed):
+    """將整數還原為作答，多選題依選項順序排列；無效的編碼會引發 ValueError"""
+    answers = {}
+    for key, options, multi in reversed(QUESTIONS):
+        bits = _field_bits(options, multi)
+        value = packed & ((1 << bits) - 1)
+        packed >>= bits
+        if multi:
+            answers[key] = [option for i, option in enumerate(options) if value & (1 << i)]
+        elif value < len(options):
+            answers[key] = options[value]
+        else:
+            raise ValueError(f"無效的選項編碼: {key}")
+    if packed:
+        raise ValueError("作答位元超出範圍")
+    return {key: answers[key] for key, _, _ in QUESTIONS}
+
+
+def encode_token(answers, assessment_date):
+    """將作答與評估時間編碼為網址安全的代碼"""
+    payload = (
+        bytes([QUESTIONNAIRE_VERSION])
+        + pack_answers(answers).to_bytes(ANSWER_BYTES, "big")
+        + int(assessment_date.timestamp()).to_bytes(TIMESTAMP_BYTES, "big")
+    )
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+
+
+def decode_token(token):
+    """解碼結果代碼，回傳 (作答, 評估時間)；代碼無效或版本不符時引發 ValueError"""
+    try:
+        payload = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, TypeError) as e:
+        raise ValueError("無法解析結果代碼") from e
+    # base64 解碼會忽略最後一個字元多出的位元、補齊字元與非字母表的字元；只接受 encode_token 產生的寫法，
+    # 同一個結果不會以不同的代碼各自佔用結果快取與共用狀態
+    if base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii") != token:
+        raise ValueError("結果代碼格式不正確")
+    if len(payload) != TOKEN_BYTES:
+        raise ValueError("結果代碼長度不正確")
+    if payload[0] != QUESTIONNAIRE_VERSION:
+        raise ValueError(f"不支援的問卷版本: {payload[0]}")
+    answers = unpack_answers(int.from_bytes(payload[1:1 + ANSWER_BYTES], "big"))
+    timestamp = int.from_bytes(payload[1 + ANSWER_BYTES:], "big")
+    return answers, datetime.fromtimestamp(timestamp)
@@ -0,0 +1,232 @@
+"""
+客戶歷次評估紀錄
+
+顧問填寫客戶代號後，每次提交的評估都會寫入 RISK_APP_HISTORY_DB（預設 history.db）：
+- assessments：每次評估一列，記錄四個維度的原始得分、風險類型，以及寫入當下該客戶
+  上一次評估的風險類型，之後判斷類型是否變動不必再回頭查詢
+- client_latest：每位客戶一列，指向最近一次評估，「最新評估」與「與上次相比是否變動」
+  只需以主鍵查詢
+- profile_changes / job_cursors：批次偵測風險類型變動的結果與進度，每次只掃描
+  上次執行之後新增的評估（見 tools/detect_profile_drift.py）
+
+客戶代號欄位與歷次評估只在顧問模式（網址帶有 ?advisor=<RISK_APP_ADMIN_TOKEN>，見 profiling.py）
+顯示，一般填寫者無法記錄或查看任何客戶的紀錄。客戶代號本身不是憑證：持有代碼的顧問彼此共用
+同一份歷史，可以查看與寫入任何客戶的紀錄，不區分負責的顧問。
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+import results_store
+import scoring
+import state_backend
+
+HISTORY_DB = os.environ.get("RISK_APP_HISTORY_DB", "history.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS assessments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_id TEXT NOT NULL,
+    token TEXT NOT NULL,
+    assessed_at INTEGER NOT NULL,
+    financial_points INTEGER NOT NULL,
+    experience_points INTEGER NOT NULL,
+    goal_points INTEGER NOT NULL,
+    psychology_points INTEGER NOT NULL,
+    profile_index INTEGER NOT NULL,
+    previous_profile_index INTEGER
+);
+CREATE INDEX IF NOT EXISTS assessments_client ON assessments (client_id, id);
+CREATE TABLE IF NOT EXISTS client_latest (
+    client_id TEXT PRIMARY KEY,
+    assessment_id INTEGER NOT NULL,
+    assessment_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profile_changes (
+    assessment_id INTEGER PRIMARY KEY,
+    client_id TEXT NOT NULL,
+    assessed_at INTEGER NOT NULL,
+    from_profile_index INTEGER NOT NULL,
+    to_profile_index INTEGER NOT NULL,
+    detected_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_cursors (
+    name TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+"""
+
+# 歷史資料庫無法開啟、被鎖定逾時或連線池已滿時引發的例外
+DATABASE_ERRORS = (sqlite3.Error, state_backend.BackendError)
+
+# 客戶最近一次評估
+LatestAssessment = namedtuple("LatestAssessment", [
+    "client_id", "assessment_id", "token", "assessed_at", "profile_index", "previous_profile_index", "assessment_count",
+])
+# 批次偵測到的風險類型變動
+ProfileChange = namedtuple("ProfileChange", [
+    "assessment_id", "client_id", "assessed_at", "from_profile_index", "to_profile_index",
+])
+
+
+def profile_name(profile_index):
+    return results_store.PROFILES[profile_index].name
+
+
+def _changed(profile_index, previous_profile_index):
+    return previous_profile_index is not None and profile_index != previous_profile_index
+
+
+class ClientHistory:
+    """以 SQLite 保存的客戶評估紀錄；連線由連線池保留，資料表在第一次連線時建立"""
+
+    def __init__(self, path, max_connections=4, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self.pool = state_backend.ConnectionPool(self._connect, max_connections=max_connections, timeout=timeout)
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _connect(self):
+        # isolation_level=None：交易由 BEGIN IMMEDIATE 明確控制，避免多個程序同時寫入同一位客戶
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        try:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                    self._schema_ready = True
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def record(self, client_id, token, result):
+        """寫入一次評估並更新客戶的最新評估，回傳評估編號"""
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                latest = conn.execute(
+                    "SELECT a.profile_index, l.assessment_count FROM client_latest l "
+                    "JOIN assessments a ON a.id = l.assessment_id WHERE l.client_id = ?",
+                    (client_id,),
+                ).fetchone()
+                previous_profile_index, count = latest if latest is not None else (None, 0)
+                assessment_id = conn.execute(
+                    "INSERT INTO assessments (client_id, token, assessed_at, financial_points, experience_points, "
+                    "goal_points, psychology_points, profile_index, previous_profile_index) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (client_id, token, result.timestamp, *result.points, result.profile_index, previous_profile_index),
+                ).lastrowid
+                conn.execute(
+                    "INSERT OR REPLACE INTO client_latest (client_id, assessment_id, assessment_count) VALUES (?, ?, ?)",
+                    (client_id, assessment_id, count + 1),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return assessment_id
+
+    def latest(self, client_id):
+        """客戶最近一次評估；沒有紀錄時回傳 None"""
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT l.client_id, a.id, a.token, a.assessed_at, a.profile_index, a.previous_profile_index, "
+                "l.assessment_count FROM client_latest l JOIN assessments a ON a.id = l.assessment_id "
+                "WHERE l.client_id = ?",
+                (client_id,),
+            ).fetchone()
+        return None if row is None else LatestAssessment(*row)
+
+    def trend(self, client_id):
+        """客戶歷次評估的各維度得分（依評估順序）"""
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT assessed_at, financial_points, experience_points, goal_points, psychology_points, profile_index "
+                "FROM assessments WHERE client_id = ? ORDER BY id",
+                (client_id,),
+            ).fetchall()
+        records = []
+        for assessed_at, *points, profile_index in rows:
+            financial_score, experience_score, goal_score, psychology_score, final_score = scoring.normalize_points(points)
+            records.append({
+                "評估時間": pd.Timestamp.fromtimestamp(assessed_at),
+                "財務狀況": financial_score,
+                "投資經驗": experience_score,
+                "投資目標": goal_score,
+                "風險心理承受度": psychology_score,
+                "綜合得分": final_score,
+                "風險類型": profile_name(profile_index),
+            })
+        return pd.DataFrame(records, columns=["評估時間", "財務狀況", "投資經驗", "投資目標", "風險心理承受度", "綜合得分", "風險類型"])
+
+    def detect_changes(self, job="profile_drift", batch_size=10000):
+        """
+        掃描上次執行後新增的評估，記錄風險類型與上一次不同者並推進進度，回傳本次偵測到的變動。
+
+        進度與偵測結果在同一個交易中寫入，中途失敗時下次會從原本的位置重新掃描。
+        """
+        changes = []
+        detected_at = int(time.time())
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT last_id FROM job_cursors WHERE name = ?", (job,)).fetchone()
+                last_id = row[0] if row is not None else 0
+                while True:
+                    rows = conn.execute(
+                        "SELECT id, client_id, assessed_at, profile_index, previous_profile_index FROM assessments "
+                        "WHERE id > ? ORDER BY id LIMIT ?",
+                        (last_id, batch_size),
+                    ).fetchall()
+                    if not rows:
+                        break
+                    for assessment_id, client_id, assessed_at, profile_index, previous_profile_index in rows:
+                        if _changed(profile_index, previous_profile_index):
+                            changes.append(ProfileChange(assessment_id, client_id, assessed_at, previous_profile_index, profile_index))
+                    last_id = rows[-1][0]
+                conn.executemany(
+                    "INSERT OR IGNORE INTO profile_changes (assessment_id, client_id, assessed_at, from_profile_index, "
+                    "to_profile_index, detected_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(*change, detected_at) for change in changes],
+                )
+                conn.execute("INSERT OR REPLACE INTO job_cursors (name, last_id) VALUES (?, ?)", (job, last_id))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return changes
+
+    def recent_changes(self, limit=100):
+        """最近偵測到的風險類型變動"""
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT assessment_id, client_id, assessed_at, from_profile_index, to_profile_index "
+                "FROM profile_changes ORDER BY assessment_id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [ProfileChange(*row) for row in rows]
+
+
+def changes_frame(changes):
+    """將 ProfileChange 轉為顯示用的表格"""
+    return pd.DataFrame(
+        [
+            {
+                "客戶代號": change.client_id,
+                "評估時間": pd.Timestamp.fromtimestamp(change.assessed_at),
+                "原風險類型": profile_name(change.from_profile_index),
+                "新風險類型": profile_name(change.to_profile_index),
+                "評估編號": change.assessment_id,
+            }
+            for change in changes
+        ],
+        columns=["客戶代號", "評估時間", "原風險類型", "新風險類型", "評估編號"],
+    )
+
+
+HISTORY = ClientHistory(HISTORY_DB)
@@ -0,0 +1,256 @@
+"""
+各處理階段的計時與計數
+
+以 timer() 量測表單繪製、評分、圖表建立、PDF 產生等階段的耗時，
+同時累計到整個程序 (PROCESS) 與各工作階段自己的 MetricsRegistry。
+
+設定環境變數 RISK_APP_METRICS_PORT 後，會在 127.0.0.1 上啟動本機端點：
+- /metrics：Prometheus 文字格式（程序層級的直方圖與計數器）
+- /metrics.json：JSON 格式，包含程序層級與各工作階段的統計
+
+同一台機器上執行多個程序時，每個程序需設定不同的埠號；設為 0 時由系統指定可用的埠號，
+實際埠號會記錄在日誌並顯示於管理頁面。埠號已被佔用時只記錄警告，應用程式照常執行。
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_LOGGER = logging.getLogger(__name__)
+
+# 直方圖的區間上限（秒）
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """固定區間的直方圖"""
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最後一格為 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.sum += other.sum
+
+    def cumulative(self):
+        total = 0
+        for n in self.counts:
+            total += n
+            yield total
+
+    def quantile(self, q):
+        """以區間內線性插值估計分位數"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for upper, n in zip(self.buckets, self.counts):
+            if n and seen + n >= rank:
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+            lower = upper
+        return self.buckets[-1]
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            **{f"p{int(q * 100)}": self.quantile(q) for q in QUANTILES},
+            "buckets": {str(le): n for le, n in zip(list(self.buckets) + ["+Inf"], self.cumulative())},
+        }
+
+
+class MetricsRegistry:
+    """一組具名的直方圖與計數器"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.created_at = time.time()
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "histograms": {name: h.snapshot() for name, h in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+
+PROCESS = MetricsRegistry()
+
+# 工作階段結束、其會話狀態被回收後，對應的統計會自動移除
+_sessions = weakref.WeakValueDictionary()
+_sessions_lock = threading.Lock()
+
+
+def register_session(session_key, registry):
+    with _sessions_lock:
+        _sessions[session_key] = registry
+
+
+@contextmanager
+def timer(name, session=None):
+    """量測區塊耗時，記錄到程序層級與（若提供）工作階段的統計"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        PROCESS.observe(name, elapsed)
+        if session is not None:
+            session.observe(name, elapsed)
+
+
+def inc(name, session=None, amount=1):
+    """累加計數器"""
+    PROCESS.inc(name, amount)
+    if session is not None:
+        session.inc(name, amount)
+
+
+def session_aggregate():
+    """合併所有仍在線工作階段的統計，回傳 (工作階段數, 合併後的 MetricsRegistry)"""
+    with _sessions_lock:
+        registries = list(_sessions.items())
+    merged = MetricsRegistry()
+    for _, registry in registries:
+        with registry.lock:
+            for name, histogram in registry.histograms.items():
+                merged.histograms.setdefault(name, Histogram(histogram.buckets)).merge(histogram)
+            for name, value in registry.counters.items():
+                merged.counters[name] = merged.counters.get(name, 0) + value
+    return len(registries), merged
+
+
+def to_json():
+    """程序層級、所有在線工作階段合計與各工作階段的統計"""
+    with _sessions_lock:
+        sessions = {key: registry.snapshot() for key, registry in _sessions.items()}
+    active, merged = session_aggregate()
+    return {
+        "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "uptime_seconds": time.time() - PROCESS.created_at,
+        "process": PROCESS.snapshot(),
+        "active_sessions": active,
+        "active_sessions_total": merged.snapshot(),
+        "sessions": sessions,
+    }
+
+
+def to_prometheus():
+    """以 Prometheus 文字格式輸出程序層級的統計"""
+    snapshot = PROCESS.snapshot()
+    lines = [
+        "# HELP risk_app_stage_seconds Duration of instrumented app stages.",
+        "# TYPE risk_app_stage_seconds histogram",
+    ]
+    for name, histogram in snapshot["histograms"].items():
+        for le, n in histogram["buckets"].items():
+            lines.append(f'risk_app_stage_seconds_bucket{{stage="{name}",le="{le}"}} {n}')
+        lines.append(f'risk_app_stage_seconds_sum{{stage="{name}"}} {histogram["sum"]}')
+        lines.append(f'risk_app_stage_seconds_count{{stage="{name}"}} {histogram["count"]}')
+    lines += [
+        "# HELP risk_app_events_total Count of app events.",
+        "# TYPE risk_app_events_total counter",
+    ]
+    for name, value in snapshot["counters"].items():
+        lines.append(f'risk_app_events_total{{event="{name}"}} {value}')
+    lines += [
+        "# HELP risk_app_active_sessions Sessions with live metrics.",
+        "# TYPE risk_app_active_sessions gauge",
+        f"risk_app_active_sessions {len(_sessions)}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = to_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            body = json.dumps(to_json(), ensure_ascii=False, indent=2).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_started = False
+_server_lock = threading.Lock()
+
+
+def start_server(port, host="127.0.0.1"):
+    """啟動本機統計端點（每個程序只啟動一次）"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
+
+
+def start_server_from_env():
+    """依 RISK_APP_METRICS_PORT 啟動統計端點；每個程序只嘗試一次，失敗時回傳 None"""
+    global _server_started
+    port = os.environ.get("RISK_APP_METRICS_PORT")
+    if not port:
+        return None
+    with _server_lock:
+        if _server_started:
+            return _server
+        _server_started = True
+    try:
+        server = start_server(int(port))
+    except OSError as e:
+        _LOGGER.warning("無法在 127.0.0.1:%s 啟動統計端點，本程序不提供 /metrics: %s", port, e)
+        return None
+    _LOGGER.info("統計端點: http://127.0.0.1:%s/metrics", server.server_address[1])
+    return server
+
+
+def server_port():
+    """統計端點實際使用的埠號；未啟動時回傳 None"""
+    return _server.server_address[1] if _server is not None else None
@@ -0,0 +1,154 @@
+"""
+結果頁的分析摘要、總體結論與風險類型比較表
+
+這些內容只取決於風險類型（5 種）與四個維度各自落在的得分區間（3 種），
+因此在啟動時一次產生全部 5 × 3⁴ = 405 種組合，顯示結果時直接查表：
+- 分析摘要表：81 種區間組合各一份 DataFrame
+- 總體結論：5 種風險類型各一段已套用顏色的 HTML
+- 風險類型比較表：5 種風險類型各一份已標示該類型的 HTML 表格。st.dataframe 顯示
+  pandas Styler 時，每次都要重新套用樣式並轉換資料，比表格本身的內容耗時得多
+"""
+import bisect
+import itertools
+from collections import namedtuple
+
+import pandas as pd
+
+import results_store
+
+# 各維度得分的區間分界：低於 40、40 至 70、70 以上
+SCORE_BANDS = (40, 70)
+
+# 各維度在三個得分區間的 (狀態, 評估結果)
+CATEGORY_NARRATIVES = [
+    ("財務狀況", [
+        ("需要改善", "財務基礎較薄弱，收入穩定性或緊急資金準備可能不足。"),
+        ("中等", "財務狀況中等，具備基本的財務穩定性，但仍有優化空間。"),
+        ("良好", "財務基礎穩健，具備良好的收入穩定性和適當的應急準備。"),
+    ]),
+    ("投資經驗", [
+        ("有限", "投資經驗較為有限，對投資工具和市場運作的了解可能不夠全面。"),
+        ("一般", "具有一定投資經驗，對基本投資工具有所了解，但深度可能有限。"),
+        ("豐富", "擁有豐富的投資經驗，對多種投資工具具備深入了解。"),
+    ]),
+    ("投資目標", [
+        ("保守短期", "投資目標偏向短期和保守，偏好保本和流動性高的投資選項。"),
+        ("平衡適中", "投資目標平衡，期望在適當風險下獲得中等回報。"),
+        ("成長導向", "投資目標偏向長期成長，願意承受短期波動以追求長期收益。"),
+    ]),
+    ("風險心理承受度", [
+        ("保守", "風險承受度較低，面對市場波動時可能傾向保守決策。"),
+        ("中等", "具有中等風險承受能力，能在一定程度上接受市場波動。"),
+        ("進取", "具有較高的風險承受能力，能夠面對較大市場波動並保持決策理性。"),
+    ]),
+]
+
+# 各風險類型的總體結論
+FINAL_ADVICE = {
+    "保守型": """
+        綜合您的評估結果，您屬於保守型投資者。您傾向於優先考慮資金安全性，避免承擔過高風險。
+    
+        在投資前，您可能會考慮:
+        - 確保擁有充足的應急資金
+        - 增加對投資基礎知識的了解
+        - 諮詢專業財務顧問以制定適合您的投資策略
+        """,
+    "穩健型": """
+        綜合您的評估結果，您屬於穩健型投資者。您能接受適度風險以獲取相應回報，但仍重視資金安全。
+    
+        在投資前，您可能會考慮:
+        - 確保財務規劃合理
+        - 學習更多關於資產配置的知識
+        - 制定明確的投資目標和期限
+        """,
+    "平衡型": """
+        綜合您的評估結果，您屬於平衡型投資者。您尋求風險與回報的平衡，能接受中等程度的市場波動。
+    
+        在投資前，您可能會考慮:
+        - 設計多元化的投資組合
+        - 定期檢視投資表現並適時調整
+        - 確立清晰的風險管理策略
+        """,
+    "成長型": """
+        綜合您的評估結果，您屬於成長型投資者。您願意為追求較高回報而承擔相應風險，能接受較明顯的市場波動。
+    
+        在投資前，您可能會考慮:
+        - 分散投資於不同資產類別和市場
+        - 持續學習並完善投資知識和技巧
+        - 設定停損點以控制潛在風險
+        """,
+    "積極型": """
+        綜合您的評估結果，您屬於積極型投資者。您追求最大化投資回報，願意承受較高風險和市場波動。
+    
+        在投資前，您可能會考慮:
+        - 確保您理解所承擔的風險水平
+        - 發展系統化的投資策略而非情緒化決策
+        - 定期檢視投資表現並準備應對市場劇烈波動
+        """,
+}
+
+# 風險類型比較表
+RISK_COMPARISON = pd.DataFrame({
+    "風險類型": ["保守型", "穩健型", "平衡型", "成長型", "積極型"],
+    "風險得分範圍": ["0-40", "41-60", "61-75", "76-90", "91-100"],
+    "特點描述": [
+        "低風險承受能力，以保本為主",
+        "中低風險承受能力，平衡安全與收益",
+        "中等風險承受能力，追求成長與穩健平衡",
+        "中高風險承受能力，注重資產增值",
+        "高風險承受能力，追求最大化回報"
+    ]
+})
+
+ResultNarrative = namedtuple("ResultNarrative", ["summary_df", "advice_html", "comparison_html"])
+
+
+def score_band(score):
+    """得分所在的區間：0 為低於 40，1 為 40 至 70，2 為 70 以上"""
+    return bisect.bisect_right(SCORE_BANDS, score)
+
+
+def _summary_table(bands):
+    rows = [[category, *narratives[band]] for (category, narratives), band in zip(CATEGORY_NARRATIVES, bands)]
+    return pd.DataFrame(rows, columns=["評估項目", "狀態", "評估結果"])
+
+
+def _advice_html(profile):
+    return f"""
+    <div style="background-color:#f8f9fa; padding:20px; border-radius:10px; border-left:5px solid {profile.color};">
+    {FINAL_ADVICE[profile.name]}
+    </div>
+    """
+
+
+def _comparison_html(profile_index, color):
+    styler = (
+        RISK_COMPARISON.style
+        .apply(lambda column: [f"background-color: {color}; color: white" if i == profile_index else "" for i in range(len(column))], axis=0)
+        .hide(axis="index")
+        .set_table_attributes('style="width:100%; border-collapse:collapse;"')
+        .set_table_styles([
+            {"selector": "th", "props": "text-align:left; padding:8px; border-bottom:1px solid #ddd;"},
+            {"selector": "td", "props": "padding:8px; border-bottom:1px solid #eee;"},
+        ])
+    )
+    return styler.to_html()
+
+
+def _build():
+    summaries = {bands: _summary_table(bands) for bands in itertools.product(range(len(SCORE_BANDS) + 1), repeat=4)}
+    advice = [_advice_html(profile) for profile in results_store.PROFILES]
+    comparisons = [_comparison_html(i, profile.color) for i, profile in enumerate(results_store.PROFILES)]
+    return {
+        (profile_index, bands): ResultNarrative(summary_df, advice[profile_index], comparisons[profile_index])
+        for profile_index in range(len(results_store.PROFILES))
+        for bands, summary_df in summaries.items()
+    }
+
+
+NARRATIVES = _build()
+
+
+def lookup(profile_index, scores):
+    """依風險類型與四個維度的得分取得預先產生的內容"""
+    return NARRATIVES[(profile_index, tuple(score_band(score) for score in scores[:4]))]
@@ -0,0 +1,168 @@
+"""
+每次重新執行的效能剖析
+
+預設關閉。以下任一方式可啟用：
+- 環境變數 RISK_APP_PROFILE=1：剖析所有工作階段的每次執行
+- 設定 RISK_APP_ADMIN_TOKEN 後，在網址加上 ?profile=<token>：只剖析該工作階段
+
+剖析結果以 pstats 格式存放於 RISK_APP_PROFILE_DIR（預設 .profiles/），
+只保留最近 RISK_APP_PROFILE_KEEP 份（預設 50）。管理頁面以 ?admin=<token> 開啟；
+顧問以 ?advisor=<token> 開啟問卷時才能記錄與查看客戶歷次評估（見 client_history.py）。
+同一時間只剖析一次執行，其他同時進行的執行不會被剖析。
+"""
+import cProfile
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+PROFILE_DIR = Path(os.environ.get("RISK_APP_PROFILE_DIR", ".profiles"))
+PROFILE_KEEP = int(os.environ.get("RISK_APP_PROFILE_KEEP", "50"))
+ADMIN_TOKEN = os.environ.get("RISK_APP_ADMIN_TOKEN") or None
+ALWAYS_ON = os.environ.get("RISK_APP_PROFILE") == "1"
+
+# Python 3.12 起 cProfile 改用整個程序共用的 sys.monitoring，同一時間只能有一個剖析器，
+# 因此以程序層級的鎖保證只有一次執行在剖析；其他同時進行（或巢狀）的執行直接略過
+_capture_lock = threading.Lock()
+_rotate_lock = threading.Lock()
+
+
+def is_admin(query_params):
+    """網址帶有正確的管理代碼時回傳 True"""
+    return ADMIN_TOKEN is not None and query_params.get("admin") == ADMIN_TOKEN
+
+
+def is_advisor(query_params):
+    """網址帶有正確的顧問代碼（與管理代碼相同）時回傳 True"""
+    return ADMIN_TOKEN is not None and query_params.get("advisor") == ADMIN_TOKEN
+
+
+def is_enabled(query_params):
+    """判斷本次執行是否需要剖析"""
+    return ALWAYS_ON or (ADMIN_TOKEN is not None and query_params.get("profile") == ADMIN_TOKEN)
+
+
+def capture(label, query_params):
+    """回傳剖析本次執行的 context manager；未啟用或已有其他執行在剖析時不做任何事"""
+    if not is_enabled(query_params) or not _capture_lock.acquire(blocking=False):
+        return nullcontext()
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # 其他剖析或除錯工具（例如 coverage）已佔用 sys.monitoring
+        _capture_lock.release()
+        return nullcontext()
+    return _capture(profiler, label)
+
+
+@contextmanager
+def _capture(profiler, label):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        # st.rerun() / st.stop() 以例外中斷執行時仍需保存
+        profiler.disable()
+        _capture_lock.release()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _save(profiler, label, elapsed_ms)
+
+
+def _save(profiler, label, elapsed_ms):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    profiler.dump_stats(PROFILE_DIR / f"{stamp}_{label}_{elapsed_ms:.0f}ms.prof")
+    with _rotate_lock:
+        for old in list_captures()[PROFILE_KEEP:]:
+            old.unlink(missing_ok=True)
+
+
+def list_captures():
+    """列出剖析檔案，最新的在前"""
+    if not PROFILE_DIR.exists():
+        return []
+    return sorted(PROFILE_DIR.glob("*.prof"), reverse=True)
+
+
+def describe_capture(path):
+    """由檔名解析擷取時間、區塊與耗時"""
+    date, clock, micros, label, elapsed = path.stem.split("_", 4)
+    captured_at = datetime.strptime(f"{date}_{clock}_{micros}", "%Y%m%d_%H%M%S_%f")
+    return {
+        "擷取時間": captured_at.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+        "區塊": label,
+        "耗時 (ms)": float(elapsed.rstrip("ms")),
+        "檔案": path.name,
+    }
+
+
+def _function_name(func):
+    filename, line, name = func
+    if filename == "~":
+        return name
+    return f"{name} ({Path(filename).name}:{line})"
+
+
+def hot_functions(path, sort_by="cumtime", limit=50):
+    """回傳依指定欄位排序的熱點函數表"""
+    stats = pstats.Stats(str(path)).stats
+    rows = [
+        {
+            "函數": _function_name(func),
+            "ncalls": nc,
+            "tottime": tt,
+            "cumtime": ct,
+            "percall": ct / nc if nc else 0.0,
+        }
+        for func, (cc, nc, tt, ct, callers) in stats.items()
+    ]
+    df = pd.DataFrame(rows, columns=["函數", "ncalls", "tottime", "cumtime", "percall"])
+    return df.sort_values(sort_by, ascending=False).head(limit).reset_index(drop=True)
+
+
+def flame_tree(path, max_depth=12, min_fraction=0.005):
+    """
+    由呼叫關係近似出火焰圖的節點，回傳 (ids, labels, parents, values)。
+
+    確定性剖析只記錄呼叫者與被呼叫者之間的邊，因此各節點的時間以該邊的累計時間估算；
+    values 為節點扣除子節點後的剩餘時間，搭配 branchvalues="remainder" 使用。
+    """
+    stats = pstats.Stats(str(path)).stats
+    callees = {}
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    roots = [(func, entry[3]) for func, entry in stats.items() if not entry[4]]
+    total = sum(ct for _, ct in roots) or 1.0
+    ids, labels, parents, values = [], [], [], []
+
+    def visit(func, cumtime, parent_id, depth, path_funcs):
+        node_id = f"{parent_id}/{len(ids)}"
+        ids.append(node_id)
+        labels.append(_function_name(func))
+        parents.append(parent_id)
+        values.append(0.0)
+        index = len(values) - 1
+        children = 0.0
+        if depth < max_depth:
+            for child, child_ct in sorted(callees.get(func, []), key=lambda c: -c[1]):
+                if child in path_funcs or child_ct / total < min_fraction:
+                    continue
+                child_ct = min(child_ct, cumtime - children)
+                if child_ct <= 0:
+                    break
+                children += child_ct
+                visit(child, child_ct, node_id, depth + 1, path_funcs | {child})
+        values[index] = max(cumtime - children, 0.0)
+
+    for func, cumtime in sorted(roots, key=lambda r: -r[1]):
+        if cumtime / total >= min_fraction:
+            visit(func, cumtime, "", 0, {func})
+    return ids, labels, parents, values
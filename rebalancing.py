@@ -0,0 +1,147 @@
+"""
+再平衡策略模擬器
+
+在同一組模擬（或歷史）報酬路徑上，一次批次評估多種再平衡策略，並計入交易成本。
+每個策略以 (檢查間隔, 偏離門檻) 表示：
+- 間隔為 0：買入持有，從不再平衡
+- 門檻為 0：定期再平衡（每日/每週/每月/每季）
+- 間隔為 1 且門檻大於 0：每日檢查的門檻帶再平衡
+- 其他組合：僅在定期檢查日且偏離超過門檻時才再平衡
+"""
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252  # 每年交易日數
+
+# 資產類別與各風險類型的目標配置（股票、債券、現金）
+ASSET_CLASSES = ["股票", "債券", "現金"]
+PROFILE_ALLOCATIONS = {
+    "保守型": [0.20, 0.50, 0.30],
+    "穩健型": [0.40, 0.45, 0.15],
+    "平衡型": [0.55, 0.35, 0.10],
+    "成長型": [0.70, 0.25, 0.05],
+    "積極型": [0.85, 0.15, 0.00],
+}
+
+# 簡化的資本市場假設：年化報酬、年化波動度與相關係數
+ASSET_RETURNS = np.array([0.07, 0.03, 0.01])
+ASSET_VOLATILITY = np.array([0.18, 0.06, 0.005])
+ASSET_CORRELATION = np.array([
+    [1.0, -0.2, 0.0],
+    [-0.2, 1.0, 0.1],
+    [0.0, 0.1, 1.0],
+])
+
+# 問卷「交易頻率」答案對應的定期再平衡間隔（交易日）
+CALENDAR_INTERVALS = {"每日": 1, "每週": 5, "每月": 21, "每季或更少": 63}
+CALENDAR_NAMES = {0: "買入持有", 1: "每日", 5: "每週", 21: "每月", 63: "每季", 126: "每半年", 252: "每年"}
+
+# 預設策略網格：檢查間隔 × 偏離門檻
+DEFAULT_INTERVALS = [0, 1, 5, 10, 21, 42, 63, 126, 252]
+DEFAULT_BANDS = [0.0] + [round(b, 2) for b in np.arange(0.01, 0.26, 0.01)]
+
+
+def policy_name(interval, band):
+    """產生策略的中文名稱"""
+    calendar = CALENDAR_NAMES.get(interval, f"每{interval}日")
+    if interval == 0:
+        return calendar
+    if band == 0:
+        return f"定期再平衡（{calendar}）"
+    if interval == 1:
+        return f"門檻帶 ±{band:.0%}"
+    return f"{calendar}檢查，門檻 ±{band:.0%}"
+
+
+def build_policies(intervals=None, bands=None):
+    """建立策略網格，回傳包含策略名稱、檢查間隔與偏離門檻的 DataFrame"""
+    intervals = DEFAULT_INTERVALS if intervals is None else intervals
+    bands = DEFAULT_BANDS if bands is None else bands
+    rows = [(0, 0.0)]
+    rows += [(interval, band) for interval in intervals if interval > 0 for band in bands]
+    return pd.DataFrame({
+        "策略": [policy_name(i, b) for i, b in rows],
+        "檢查間隔": [i for i, _ in rows],
+        "偏離門檻": [b for _, b in rows],
+    })
+
+
+def simulate_returns(n_paths=500, years=1.0, seed=None):
+    """以相關的幾何布朗運動模擬每日簡單報酬，形狀為 (交易日, 路徑, 資產)"""
+    rng = np.random.default_rng(seed)
+    steps = int(round(TRADING_DAYS * years))
+    dt = 1.0 / TRADING_DAYS
+    cov = np.outer(ASSET_VOLATILITY, ASSET_VOLATILITY) * ASSET_CORRELATION * dt
+    chol = np.linalg.cholesky(cov)
+    drift = (ASSET_RETURNS - 0.5 * ASSET_VOLATILITY ** 2) * dt
+    shocks = rng.standard_normal((steps, n_paths, len(ASSET_CLASSES))) @ chol.T
+    return np.expm1(drift + shocks)
+
+
+def simulate_policies(returns, target, policies, cost_rate=0.001):
+    """
+    在共享報酬路徑上批次模擬所有策略。
+
+    returns 為每日簡單報酬，形狀 (交易日, 路徑, 資產) 或歷史資料的 (交易日, 資產)；
+    交易成本按成交金額的 cost_rate 比例從組合中扣除。
+    """
+    returns = np.asarray(returns, dtype=float)
+    if returns.ndim == 2:
+        returns = returns[:, None, :]
+    steps, n_paths, n_assets = returns.shape
+    target = np.asarray(target, dtype=float)
+    intervals = policies["檢查間隔"].to_numpy()
+    bands = policies["偏離門檻"].to_numpy(dtype=float)
+    n_policies = len(policies)
+
+    # 所有策略共用同一組路徑，持倉形狀為 (策略, 路徑, 資產)，初始財富為 1
+    holdings = np.empty((n_policies, n_paths, n_assets))
+    holdings[:] = target
+    growth = 1.0 + returns
+    costs = np.zeros((n_policies, n_paths))
+    rebalances = np.zeros((n_policies, n_paths))
+    active = intervals > 0
+    safe_intervals = np.maximum(intervals, 1)
+
+    for t in range(steps):
+        holdings *= growth[t]
+
+        # 僅對本日需要檢查的策略計算偏離程度
+        due = np.flatnonzero(active & ((t + 1) % safe_intervals == 0))
+        if due.size == 0:
+            continue
+        held = holdings[due]
+        wealth = held.sum(axis=-1)
+        deviation = np.abs(held / wealth[..., None] - target).max(axis=-1)
+        trigger = deviation > bands[due, None]
+        if not trigger.any():
+            continue
+
+        # 按目標配置重新分配，成本依成交金額計算
+        trades = np.abs(wealth[..., None] * target - held).sum(axis=-1)
+        cost = np.where(trigger, trades * cost_rate, 0.0)
+        rebalanced = (wealth - cost)[..., None] * target
+        holdings[due] = np.where(trigger[..., None], rebalanced, held)
+        costs[due] += cost
+        rebalances[due] += trigger
+
+    wealth = holdings.sum(axis=-1)
+    years = steps / TRADING_DAYS
+    annual_return = wealth ** (1.0 / years) - 1.0
+    final_deviation = np.abs(holdings / wealth[..., None] - target).max(axis=-1)
+
+    results = policies.copy()
+    results["平均年化報酬"] = annual_return.mean(axis=1)
+    results["報酬標準差"] = annual_return.std(axis=1)
+    results["5%分位報酬"] = np.quantile(annual_return, 0.05, axis=1)
+    results["平均再平衡次數"] = rebalances.mean(axis=1)
+    results["平均交易成本"] = costs.mean(axis=1)
+    results["期末最大偏離"] = final_deviation.mean(axis=1)
+    return results
+
+
+def run_profile_simulation(risk_profile, cost_rate=0.001, n_paths=500, years=1.0, seed=42, policies=None):
+    """針對某個風險類型的目標配置，執行完整的策略網格模擬"""
+    policies = build_policies() if policies is None else policies
+    returns = simulate_returns(n_paths=n_paths, years=years, seed=seed)
+    return simulate_policies(returns, PROFILE_ALLOCATIONS[risk_profile], policies, cost_rate=cost_rate)
@@ -0,0 +1,184 @@
+"""
+評估結果的精簡表示與閒置回收
+
+會話狀態只保存結果代碼（約 15 個字元）。完整的結果以 AssessmentResult 存放在
+程序層級的 ResultCache：只記錄四個維度的整數原始得分、風險類型索引、評估時間與
+壓縮後的作答，類型名稱、描述與顏色等文字則引用所有工作階段共用的 PROFILES。
+
+閒置超過 RISK_APP_RESULT_IDLE_SECONDS（預設 600 秒）或超出 RISK_APP_RESULT_CACHE_SIZE
+（預設 1000 筆）的結果會被移出快取，工作階段只留下結果代碼；再次存取時先查詢共用狀態後端
+（見 state_backend.py），都沒有時才由代碼重建。
+"""
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+import answer_token
+import scoring
+import state_backend
+
+# 所有工作階段共用的風險類型資訊
+ProfileInfo = namedtuple("ProfileInfo", ["name", "description", "color"])
+PROFILES = tuple(ProfileInfo(name, description, color) for _, name, description, color in scoring.RISK_PROFILES)
+PROFILE_INDEX = {profile.name: i for i, profile in enumerate(PROFILES)}
+
+# 共用後端中的結果格式：問卷版本、四個維度的原始得分、風險類型索引、評估時間、壓縮後的作答
+_RECORD = struct.Struct(">B4BBI")
+
+
+class AssessmentResult:
+    """單次評估的精簡結果"""
+
+    __slots__ = ("points", "profile_index", "timestamp", "packed_answers")
+
+    def __init__(self, points, profile_index, timestamp, packed_answers):
+        self.points = points  # 四個維度的原始得分（小整數，由直譯器共用）
+        self.profile_index = profile_index
+        self.timestamp = timestamp
+        self.packed_answers = packed_answers
+
+    @classmethod
+    def from_answers(cls, answers, assessment_date):
+        points = scoring.calculate_points(answers)
+        final_score = scoring.normalize_points(points)[4]
+        profile_index = PROFILE_INDEX[scoring.classify(final_score)[0]]
+        return cls(points, profile_index, int(assessment_date.timestamp()), answer_token.pack_answers(answers))
+
+    @classmethod
+    def from_token(cls, token):
+        answers, assessment_date = answer_token.decode_token(token)
+        return cls.from_answers(answers, assessment_date)
+
+    def to_bytes(self):
+        header = _RECORD.pack(scoring.QUESTIONNAIRE_VERSION, *self.points, self.profile_index, self.timestamp)
+        return header + self.packed_answers.to_bytes(answer_token.ANSWER_BYTES, "big")
+
+    @classmethod
+    def from_bytes(cls, data):
+        """還原 to_bytes() 的結果；格式或問卷版本不符時引發 ValueError"""
+        if len(data) != _RECORD.size + answer_token.ANSWER_BYTES:
+            raise ValueError("結果記錄長度不正確")
+        version, *fields = _RECORD.unpack_from(data)
+        if version != scoring.QUESTIONNAIRE_VERSION:
+            raise ValueError(f"不支援的問卷版本: {version}")
+        points, profile_index, timestamp = tuple(fields[:4]), fields[4], fields[5]
+        return cls(points, profile_index, timestamp, int.from_bytes(data[_RECORD.size:], "big"))
+
+    @property
+    def scores(self):
+        """(財務狀況, 投資經驗, 投資目標, 風險心理承受度, 綜合) 得分"""
+        return scoring.normalize_points(self.points)
+
+    @property
+    def profile(self):
+        return PROFILES[self.profile_index]
+
+    @property
+    def risk_profile(self):
+        return self.profile.name
+
+    @property
+    def description(self):
+        return self.profile.description
+
+    @property
+    def color(self):
+        return self.profile.color
+
+    @property
+    def assessment_date(self):
+        return datetime.fromtimestamp(self.timestamp).strftime(scoring.DATE_FORMAT)
+
+    @property
+    def answers(self):
+        return answer_token.unpack_answers(self.packed_answers)
+
+    @property
+    def user_answers(self):
+        """顯示用的回答摘要"""
+        return scoring.format_answers(self.answers)
+
+
+class ResultCache:
+    """以結果代碼為鍵的 LRU 快取，並回收閒置的結果；設定 store 時同時寫入共用狀態"""
+
+    def __init__(self, max_entries=1000, idle_seconds=600, sweep_interval=30, store=None):
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        self.sweep_interval = sweep_interval
+        self.store = store
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # 結果代碼 -> (最後存取時間, AssessmentResult)
+        self.last_sweep = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def put(self, token, result, share=True):
+        # 結果的回收由本快取負責，共用狀態只寫入後端，不佔用其程序內快取
+        if share and self.store is not None and self.store.shared:
+            self.store.set(f"result:{token}", result.to_bytes(), local=False)
+        now = time.monotonic()
+        with self.lock:
+            self.entries[token] = (now, result)
+            self.entries.move_to_end(token)
+            self._evict(now)
+
+    def get(self, token):
+        """取得結果；不在快取中時依序查詢共用狀態與由結果代碼重建（代碼無效時引發 ValueError）"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is not None:
+                self.hits += 1
+                self.entries[token] = (now, entry[1])
+                self.entries.move_to_end(token)
+                self._evict(now)
+                return entry[1]
+            self.misses += 1
+        record = None
+        if self.store is not None and self.store.shared:
+            record = self.store.get(f"result:{token}", local=False)
+        if record is not None:
+            try:
+                result = AssessmentResult.from_bytes(record)
+            except ValueError:
+                record = None
+        if record is None:
+            result = AssessmentResult.from_token(token)
+        self.put(token, result, share=record is None)
+        return result
+
+    def _evict(self, now):
+        evicted = 0
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            evicted += 1
+        if now - self.last_sweep >= self.sweep_interval:
+            self.last_sweep = now
+            # 依最後存取時間排序，最舊的在前
+            while self.entries:
+                last_access, _ = next(iter(self.entries.values()))
+                if now - last_access < self.idle_seconds:
+                    break
+                self.entries.popitem(last=False)
+                evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+RESULTS = ResultCache(
+    max_entries=int(os.environ.get("RISK_APP_RESULT_CACHE_SIZE", "1000")),
+    idle_seconds=float(os.environ.get("RISK_APP_RESULT_IDLE_SECONDS", "600")),
+    store=state_backend.STORE,
+)
@@ -0,0 +1,149 @@
+"""
+問卷題目選項與評分規則
+
+表單、評分與結果代碼共用此處的定義；調整題目或選項時需同步提高 QUESTIONNAIRE_VERSION。
+"""
+QUESTIONNAIRE_VERSION = 1
+
+# 依問卷順序排列的題目：(回答鍵, 選項, 是否為多選題)
+QUESTIONS = [
+    # A. 財務狀況
+    ("收入穩定性", ["固定薪資", "自由業/彈性收入", "投資收益", "無固定收入"], False),
+    ("應急資金", ["6個月以上", "3-6個月", "1-3個月", "不到1個月"], False),
+    ("負債比例", ["無負債", "低於30%", "30%-50%", "50%以上"], False),
+    ("財務責任", ["無重大財務責任", "房貸/車貸", "教育支出", "家庭撫養責任"], True),
+    ("資產配置", ["主要為現金/存款", "平均分配於現金與投資", "主要為投資"], False),
+    # B. 投資經驗
+    ("投資年資", ["5年以上", "3-5年", "1-3年", "1年以下或無經驗"], False),
+    ("投資知識", ["股票", "債券", "ETF", "期貨/選擇權", "外匯"], True),
+    ("交易頻率", ["每日", "每週", "每月", "每季或更少"], False),
+    ("投資規模", ["10%以下", "10%-30%", "30%-50%", "50%以上"], False),
+    # C. 投資目標
+    ("投資期限", ["10年以上", "5-10年", "1-5年", "1年以下"], False),
+    ("投資目的", ["保本為主", "穩定收入", "資本增值", "追求高報酬"], False),
+    ("資金需求", ["0%", "25%以下", "25%-50%", "50%以上"], False),
+    ("預期報酬率", ["3%以下", "3%-8%", "8%-15%", "15%以上"], False),
+    # D. 風險心理承受度
+    ("市場下跌反應", ["立即賣出止損", "賣出部分持倉", "持有不動", "加碼買入"], False),
+    ("損失承受度", ["5%以下", "5%-15%", "15%-30%", "30%以上"], False),
+    ("風險偏好情境選擇", ["A選項", "B選項"], False),
+    ("波動接受度", ["希望完全穩定", "接受小幅波動", "能接受適度波動", "可以承受大幅波動"], False),
+    ("投資理念", ["安全第一，寧願低報酬也要低風險", "希望在安全與報酬間取得平衡", "願意承擔更多風險以獲取更高報酬"], False),
+    ("行為金融學測試", ["賣出部分持股，將剩餘資金轉向低風險資產", "利用手中現金加碼買入，期望在市場反彈時獲得更大收益"], False),
+    ("投資決策方式", ["情緒和直覺", "他人建議", "基本面和技術分析結合", "系統化策略和數據分析"], False),
+]
+OPTIONS = {key: options for key, options, _ in QUESTIONS}
+
+# 單選題各選項的得分
+SCORES = {
+    "收入穩定性": {"固定薪資": 5, "自由業/彈性收入": 3, "投資收益": 2, "無固定收入": 0},
+    "應急資金": {"6個月以上": 5, "3-6個月": 3, "1-3個月": 1, "不到1個月": 0},
+    "負債比例": {"無負債": 5, "低於30%": 4, "30%-50%": 2, "50%以上": 0},
+    "資產配置": {"主要為現金/存款": 1, "平均分配於現金與投資": 3, "主要為投資": 5},
+    "投資年資": {"5年以上": 5, "3-5年": 4, "1-3年": 2, "1年以下或無經驗": 0},
+    "交易頻率": {"每日": 5, "每週": 4, "每月": 3, "每季或更少": 1},
+    "投資規模": {"10%以下": 1, "10%-30%": 2, "30%-50%": 3, "50%以上": 5},
+    "投資期限": {"10年以上": 5, "5-10年": 4, "1-5年": 2, "1年以下": 0},
+    "投資目的": {"保本為主": 1, "穩定收入": 2, "資本增值": 4, "追求高報酬": 5},
+    "資金需求": {"0%": 5, "25%以下": 3, "25%-50%": 2, "50%以上": 0},
+    "預期報酬率": {"3%以下": 1, "3%-8%": 3, "8%-15%": 4, "15%以上": 5},
+    "市場下跌反應": {"立即賣出止損": 0, "賣出部分持倉": 1, "持有不動": 3, "加碼買入": 5},
+    "損失承受度": {"5%以下": 1, "5%-15%": 2, "15%-30%": 4, "30%以上": 5},
+    "風險偏好情境選擇": {"A選項": 2, "B選項": 4},
+    "波動接受度": {"希望完全穩定": 0, "接受小幅波動": 2, "能接受適度波動": 3, "可以承受大幅波動": 5},
+    "投資理念": {"安全第一，寧願低報酬也要低風險": 1, "希望在安全與報酬間取得平衡": 3, "願意承擔更多風險以獲取更高報酬": 5},
+    "行為金融學測試": {"賣出部分持股，將剩餘資金轉向低風險資產": 2, "利用手中現金加碼買入，期望在市場反彈時獲得更大收益": 4},
+    "投資決策方式": {"情緒和直覺": 1, "他人建議": 2, "基本面和技術分析結合": 4, "系統化策略和數據分析": 5},
+}
+
+# 風險承受能力分類：(得分上限, 類型, 描述, 顏色)
+RISK_PROFILES = [
+    (40, "保守型", "您偏好低風險投資，以保本為主要考量。", "#4575b4"),  # 藍色，代表保守
+    (60, "穩健型", "您偏好中低風險投資，追求收益與安全的平衡。", "#74add1"),  # 淺藍色，代表中低風險
+    (75, "平衡型", "您能接受中等風險，追求成長與穩定的平衡。", "#46b337"),  # 綠色，代表中等風險
+    (90, "成長型", "您偏好中高風險投資，注重資產增值。", "#fdae61"),  # 橙色，代表中高風險
+    (100, "積極型", "您能接受高風險投資，以追求最大化報酬為目標。", "#d73027"),  # 紅色，代表高風險
+]
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def format_answers(answers):
+    """將作答轉為顯示用的回答摘要（多選題以逗號連接）"""
+    formatted = {}
+    for key, _, multi in QUESTIONS:
+        value = answers[key]
+        if multi:
+            value = ", ".join(value) if value else "無選擇"
+        formatted[key] = value
+    return formatted
+
+
+def classify(final_score):
+    """依綜合得分回傳 (類型, 描述, 顏色)"""
+    for upper, risk_profile, description, color in RISK_PROFILES:
+        if final_score <= upper:
+            return risk_profile, description, color
+    return RISK_PROFILES[-1][1:]
+
+
+# 各維度的最大可能得分與權重（財務狀況、投資經驗、投資目標、風險心理承受度）
+MAX_POINTS = (25, 20, 20, 35)
+WEIGHTS = (0.25, 0.20, 0.20, 0.35)
+
+
+def calculate_points(answers):
+    """依作答計算四個維度的原始得分（整數）"""
+    # A. 財務狀況評分計算
+    a1_score = SCORES["收入穩定性"][answers["收入穩定性"]]
+    a2_score = SCORES["應急資金"][answers["應急資金"]]
+    a3_score = SCORES["負債比例"][answers["負債比例"]]
+
+    # A4需要特殊處理（多選題）
+    financial_obligations = answers["財務責任"]
+    a4_score = 0
+    if "無重大財務責任" in financial_obligations:
+        a4_score = 5
+    else:
+        if "房貸/車貸" in financial_obligations:
+            a4_score -= 2
+        if "教育支出" in financial_obligations:
+            a4_score -= 1
+        if "家庭撫養責任" in financial_obligations:
+            a4_score -= 2
+    # 確保A4分數不低於0
+    a4_score = max(0, a4_score)
+
+    a5_score = SCORES["資產配置"][answers["資產配置"]]
+    financial_points = a1_score + a2_score + a3_score + a4_score + a5_score
+
+    # B. 投資經驗評分計算
+    b1_score = SCORES["投資年資"][answers["投資年資"]]
+
+    # B2需要特殊處理（多選題）
+    b2_score = len(answers["投資知識"])  # 每選一項得1分，最高5分
+
+    b3_score = SCORES["交易頻率"][answers["交易頻率"]]
+    b4_score = SCORES["投資規模"][answers["投資規模"]]
+    experience_points = b1_score + min(b2_score, 5) + b3_score + b4_score
+
+    # C. 投資目標評分計算
+    c_keys = ["投資期限", "投資目的", "資金需求", "預期報酬率"]
+    goal_points = sum(SCORES[key][answers[key]] for key in c_keys)
+
+    # D. 風險心理承受度評分計算
+    d_keys = ["市場下跌反應", "損失承受度", "風險偏好情境選擇", "波動接受度", "投資理念", "行為金融學測試", "投資決策方式"]
+    psychology_points = sum(SCORES[key][answers[key]] for key in d_keys)
+
+    return financial_points, experience_points, goal_points, psychology_points
+
+
+def normalize_points(points):
+    """將原始得分標準化為 0-100，並依權重計算最終得分"""
+    financial_score, experience_score, goal_score, psychology_score = (
+        p / max_points * 100 for p, max_points in zip(points, MAX_POINTS)
+    )
+    final_score = (financial_score * WEIGHTS[0] + experience_score * WEIGHTS[1]
+                   + goal_score * WEIGHTS[2] + psychology_score * WEIGHTS[3])
+    return financial_score, experience_score, goal_score, psychology_score, final_score
+
@@ -0,0 +1,417 @@
+"""
+跨程序共用的結果與產出物狀態
+
+多個 Streamlit 程序部署在負載平衡器後方時，st.session_state 只存在於單一程序中；
+使用者重新連線到另一個程序後，結果與快取的產出物（PDF、圖表 JSON）都必須重算。
+此模組提供可替換的共用儲存後端，前方再加上一層程序內 LRU，常見路徑不必經過網路：
+
+- 未設定：只使用程序內快取（單一程序部署，與原本行為相同）
+- sqlite:///state.db 或 sqlite:////var/lib/risk-app/state.db?max_connections=8：本機 SQLite 檔案，
+  適用於同一台機器上的多個程序
+- redis://[:password@]host:port/db?max_connections=8&timeout=1.0：Redis 協定 (RESP)，
+  內建連線池，不需額外套件；本機測試可使用 tools/resp_server.py
+
+以環境變數 RISK_APP_STATE_BACKEND 選擇後端，RISK_APP_STATE_TTL 設定共用資料的保存秒數
+（預設 86400），RISK_APP_STATE_LOCAL_BYTES 設定程序內快取的容量（預設 32 MB）。
+後端無法連線時只記錄錯誤並改用程序內快取，RISK_APP_STATE_RETRY_SECONDS（預設 30 秒）後再重試。
+"""
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import metrics
+
+_LOGGER = logging.getLogger(__name__)
+
+# 程序內快取每筆項目在鍵與值之外的額外用量（OrderedDict 節點與雜湊表位置，約略值）
+_ENTRY_OVERHEAD = 100
+
+
+class BackendError(Exception):
+    """共用後端回傳錯誤或無法使用"""
+
+
+class SQLiteBackend:
+    """以 SQLite 檔案保存的鍵值資料，同一台機器上的多個程序可共用"""
+
+    def __init__(self, path, max_connections=8, timeout=1.0, purge_every=500):
+        self.path = path
+        self.timeout = timeout
+        self.purge_every = purge_every
+        # Streamlit 每次重新執行腳本都可能換一個執行緒，連線由連線池保留，不綁定在執行緒上
+        self.pool = ConnectionPool(self._connect, max_connections=max_connections, timeout=timeout)
+        self._writes = 0
+        self._schema_ready = False
+
+    def _connect(self):
+        # 第一次存取時才開啟檔案並建立資料表；失敗時由 StateStore 改用程序內快取，之後再重試
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        try:
+            conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            if not self._schema_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                with conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS state ("
+                        "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+                    )
+                self._schema_ready = True
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def get(self, key):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time()),
+            ).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self.pool.connection() as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at))
+            self._writes += 1
+            if self._writes % self.purge_every == 0:
+                conn.execute("DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    def delete(self, key):
+        with self.pool.connection() as conn, conn:
+            conn.execute("DELETE FROM state WHERE key = ?", (key,))
+
+    def ping(self):
+        with self.pool.connection() as conn:
+            conn.execute("SELECT 1").fetchone()
+        return True
+
+    def describe(self):
+        return f"sqlite:{self.path}"
+
+
+class _RespConnection:
+    """單一條 Redis 協定 (RESP2) 連線"""
+
+    def __init__(self, host, port, timeout):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    def command(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode("utf-8")
+            elif isinstance(arg, (int, float)):
+                arg = str(arg).encode("ascii")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self.sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("連線已中斷")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode("utf-8")
+        if kind == b"-":
+            raise BackendError(body.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("連線已中斷")
+            return data[:-2]
+        if kind == b"*":
+            length = int(body)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise BackendError(f"無法解析的回應: {line[:20]!r}")
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class ConnectionPool:
+    """固定上限的連線池；閒置連線以後進先出重複使用"""
+
+    def __init__(self, connect, max_connections=8, timeout=1.0):
+        self.connect = connect
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self.created = 0
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise BackendError("連線池已滿")
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        try:
+            conn = self.connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def release(self, conn, broken=False):
+        if broken:
+            conn.close()
+        else:
+            with self._lock:
+                self._idle.append(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """取出一條連線，結束時歸還；過程中發生例外時關閉該連線，不再重複使用"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, broken=True)
+            raise
+        self.release(conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {"idle": len(self._idle), "created": self.created, "max": self.max_connections}
+
+
+class RedisBackend:
+    """以 Redis 協定存取的鍵值資料（不依賴 redis 套件）"""
+
+    def __init__(self, host="127.0.0.1", port=6379, db=0, password=None, max_connections=8, timeout=1.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.pool = ConnectionPool(self._connect, max_connections=max_connections, timeout=timeout)
+
+    def _connect(self):
+        conn = _RespConnection(self.host, self.port, self.timeout)
+        try:
+            if self.password:
+                conn.command("AUTH", self.password)
+            if self.db:
+                conn.command("SELECT", self.db)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _command(self, *args, retry=True):
+        conn = self.pool.acquire()
+        try:
+            reply = conn.command(*args)
+        except BackendError:
+            # 伺服器回傳的錯誤不影響連線本身
+            self.pool.release(conn)
+            raise
+        except ConnectionError:
+            # 閒置連線可能已被伺服器關閉（例如伺服器重新啟動），以新連線重試一次
+            self.pool.release(conn, broken=True)
+            if not retry:
+                raise
+            return self._command(*args, retry=False)
+        except BaseException:
+            self.pool.release(conn, broken=True)
+            raise
+        self.pool.release(conn)
+        return reply
+
+    def get(self, key):
+        return self._command("GET", key)
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            self._command("SET", key, value, "EX", int(ttl))
+        else:
+            self._command("SET", key, value)
+
+    def delete(self, key):
+        self._command("DEL", key)
+
+    def ping(self):
+        return self._command("PING") == "PONG"
+
+    def describe(self):
+        return f"redis://{self.host}:{self.port}/{self.db}"
+
+
+def backend_from_url(url):
+    """依網址建立共用後端；空字串或 memory:// 代表不使用共用後端"""
+    if not url or url.startswith("memory:"):
+        return None
+    parts = urlsplit(url)
+    options = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+    timeout = float(options.get("timeout", "1.0"))
+    if parts.scheme == "sqlite":
+        # sqlite:///state.db 為相對路徑，sqlite:////var/lib/state.db 為絕對路徑
+        path = (parts.netloc + parts.path)[1:]
+        if not path:
+            raise ValueError("sqlite 網址缺少檔案路徑")
+        return SQLiteBackend(path, max_connections=int(options.get("max_connections", "8")), timeout=timeout)
+    if parts.scheme == "redis":
+        db = parts.path.lstrip("/")
+        return RedisBackend(
+            host=parts.hostname or "127.0.0.1",
+            port=parts.port or 6379,
+            db=int(db) if db else 0,
+            password=unquote(parts.password) if parts.password else None,
+            max_connections=int(options.get("max_connections", "8")),
+            timeout=timeout,
+        )
+    raise ValueError(f"不支援的狀態後端: {parts.scheme}")
+
+
+class StateStore:
+    """程序內 LRU 快取加上（可選的）共用後端"""
+
+    def __init__(self, backend=None, ttl=86400, local_bytes=32 * 1024 * 1024, retry_seconds=30):
+        self.backend = backend
+        self.ttl = ttl
+        self.local_bytes = local_bytes
+        self.retry_seconds = retry_seconds
+        self.lock = threading.Lock()
+        self.local = OrderedDict()  # 鍵 -> bytes
+        self.local_size = 0
+        self.down_until = 0.0
+        self.counts = {"local_hits": 0, "backend_hits": 0, "misses": 0, "backend_errors": 0}
+
+    def _count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+        metrics.inc(f"state_{name}")
+
+    @property
+    def shared(self):
+        """是否設定了共用後端"""
+        return self.backend is not None
+
+    @staticmethod
+    def _entry_size(key, value):
+        return sys.getsizeof(key) + sys.getsizeof(value) + _ENTRY_OVERHEAD
+
+    def _remember(self, key, value):
+        size = self._entry_size(key, value)
+        if size > self.local_bytes:
+            return
+        with self.lock:
+            old = self.local.pop(key, None)
+            if old is not None:
+                self.local_size -= self._entry_size(key, old)
+            self.local[key] = value
+            self.local_size += size
+            while self.local_size > self.local_bytes:
+                evicted_key, evicted = self.local.popitem(last=False)
+                self.local_size -= self._entry_size(evicted_key, evicted)
+
+    def _backend_available(self):
+        return self.backend is not None and time.monotonic() >= self.down_until
+
+    def _backend_failed(self, error):
+        self.down_until = time.monotonic() + self.retry_seconds
+        self._count("backend_errors")
+        _LOGGER.warning("共用狀態後端 %s 無法使用，%s 秒內改用程序內快取: %s",
+                        self.backend.describe(), self.retry_seconds, error)
+
+    def get(self, key, local=True):
+        """
+        取得 bytes；程序內快取優先，其次是共用後端，都沒有時回傳 None。
+
+        local=False 時不經過程序內快取，適用於呼叫端自行快取並管理回收的資料。
+        """
+        value = None
+        if local:
+            with self.lock:
+                value = self.local.get(key)
+                if value is not None:
+                    self.local.move_to_end(key)
+        if value is not None:
+            self._count("local_hits")
+            return value
+        if self._backend_available():
+            try:
+                with metrics.timer("state_backend_get"):
+                    value = self.backend.get(key)
+            except (OSError, BackendError, sqlite3.Error) as e:
+                self._backend_failed(e)
+            if value is not None:
+                self._count("backend_hits")
+                if local:
+                    self._remember(key, value)
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key, value, ttl=None, local=True):
+        """寫入程序內快取與共用後端；後端失敗時只保留在程序內（local=False 時則不保留）"""
+        value = bytes(value)
+        if local:
+            self._remember(key, value)
+        if self._backend_available():
+            try:
+                with metrics.timer("state_backend_set"):
+                    self.backend.set(key, value, ttl or self.ttl)
+            except (OSError, BackendError, sqlite3.Error) as e:
+                self._backend_failed(e)
+
+    def get_or_create(self, key, create, ttl=None):
+        """取得已快取的值，沒有時以 create() 產生並寫入"""
+        value = self.get(key)
+        if value is None:
+            value = create()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counts, local_entries=len(self.local), local_bytes=self.local_size)
+        stats["backend"] = self.backend.describe() if self.backend is not None else "memory"
+        stats["backend_down"] = self.backend is not None and time.monotonic() < self.down_until
+        if self.backend is not None:
+            stats["pool"] = self.backend.pool.stats()
+        return stats
+
+
+def store_from_env():
+    return StateStore(
+        backend=backend_from_url(os.environ.get("RISK_APP_STATE_BACKEND", "")),
+        ttl=int(os.environ.get("RISK_APP_STATE_TTL", "86400")),
+        local_bytes=int(os.environ.get("RISK_APP_STATE_LOCAL_BYTES", str(32 * 1024 * 1024))),
+        retry_seconds=float(os.environ.get("RISK_APP_STATE_RETRY_SECONDS", "30")),
+    )
+
+
+STORE = store_from_env()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 應用程式模組位於專案根目錄
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,116 @@
+"""結果代碼的位元配置與評分規則"""
+import base64
+import random
+from datetime import datetime
+
+import pytest
+
+import answer_token
+import scoring
+
+# 每題選第一個選項（多選題只選第一項）
+FIRST_OPTIONS = {key: options[:1] if multi else options[0] for key, options, multi in scoring.QUESTIONS}
+# 每題選最後一個選項；財務責任與投資知識另外指定以涵蓋多選題的特殊計分
+LAST_OPTIONS = {key: options[-1:] if multi else options[-1] for key, options, multi in scoring.QUESTIONS}
+LAST_OPTIONS["財務責任"] = ["房貸/車貸", "家庭撫養責任"]
+LAST_OPTIONS["投資知識"] = list(scoring.OPTIONS["投資知識"])
+
+
+def _random_answers(rng):
+    answers = {}
+    for key, options, multi in scoring.QUESTIONS:
+        if multi:
+            # 多選題以選項順序還原
+            answers[key] = [option for option in options if rng.random() < 0.5]
+        else:
+            answers[key] = rng.choice(options)
+    return answers
+
+
+def _payload(token):
+    return bytearray(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+
+
+def _token(payload):
+    return base64.urlsafe_b64encode(bytes(payload)).rstrip(b"=").decode("ascii")
+
+
+def test_round_trip_random_answers():
+    rng = random.Random(0)
+    for _ in range(2000):
+        answers = _random_answers(rng)
+        assessment_date = datetime.fromtimestamp(rng.randrange(0, 2 ** 32))
+        token = answer_token.encode_token(answers, assessment_date)
+        assert len(token) == 15
+        assert answer_token.decode_token(token) == (answers, assessment_date)
+
+
+def test_layout():
+    assert answer_token.ANSWER_BITS == 43
+    assert answer_token.TOKEN_BYTES == 11
+    payload = _payload(answer_token.encode_token(FIRST_OPTIONS, datetime(2026, 1, 1)))
+    assert payload[0] == scoring.QUESTIONNAIRE_VERSION
+
+
+def test_rejects_wrong_version():
+    payload = _payload(answer_token.encode_token(FIRST_OPTIONS, datetime(2026, 1, 1)))
+    payload[0] = scoring.QUESTIONNAIRE_VERSION + 1
+    with pytest.raises(ValueError, match="版本"):
+        answer_token.decode_token(_token(payload))
+
+
+@pytest.mark.parametrize("length", [0, 10, 12])
+def test_rejects_wrong_length(length):
+    payload = _payload(answer_token.encode_token(FIRST_OPTIONS, datetime(2026, 1, 1)))
+    payload = (payload * 2)[:length]
+    with pytest.raises(ValueError):
+        answer_token.decode_token(_token(payload))
+
+
+def test_rejects_out_of_range_option_index():
+    # 資產配置只有 3 個選項，以 2 bits 編碼；數值 3 不對應任何選項
+    key = "資產配置"
+    assert len(scoring.OPTIONS[key]) == 3
+    position = [k for k, _, _ in scoring.QUESTIONS].index(key)
+    shift = sum(answer_token._field_bits(options, multi) for _, options, multi in scoring.QUESTIONS[position + 1:])
+    packed = answer_token.pack_answers(FIRST_OPTIONS) | (0b11 << shift)
+    with pytest.raises(ValueError, match=key):
+        answer_token.unpack_answers(packed)
+
+    payload = _payload(answer_token.encode_token(FIRST_OPTIONS, datetime(2026, 1, 1)))
+    payload[1:1 + answer_token.ANSWER_BYTES] = packed.to_bytes(answer_token.ANSWER_BYTES, "big")
+    with pytest.raises(ValueError, match=key):
+        answer_token.decode_token(_token(payload))
+
+
+@pytest.mark.parametrize("answers, points, scores", [
+    (FIRST_OPTIONS, (21, 12, 12, 7), (84.0, 60.0, 60.0, 20.0, 52.0)),
+    (LAST_OPTIONS, (5, 11, 10, 33), (20.0, 55.0, 50.0, 33 / 35 * 100, 59.0)),
+])
+def test_scoring(answers, points, scores):
+    assert scoring.calculate_points(answers) == points
+    assert scoring.normalize_points(points) == pytest.approx(scores)
+
+
+def test_rejects_non_canonical_tokens():
+    token = answer_token.encode_token(FIRST_OPTIONS, datetime(2026, 1, 1))
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    # 最後一個字元只用到 4 bits，其餘 2 bits 不同的寫法解碼後相同
+    last = alphabet.index(token[-1])
+    variants = [token[:-1] + alphabet[last ^ spare] for spare in (1, 2, 3)]
+    variants += [token + "=", token + "=="]
+    for variant in variants:
+        assert _payload(variant) == _payload(token)
+        with pytest.raises(ValueError):
+            answer_token.decode_token(variant)
+
+
+def test_rejects_standard_base64_alphabet():
+    rng = random.Random(1)
+    while True:
+        token = answer_token.encode_token(_random_answers(rng), datetime(2026, 1, 1))
+        if "-" in token or "_" in token:
+            break
+    answer_token.decode_token(token)
+    with pytest.raises(ValueError):
+        answer_token.decode_token(token.replace("-", "+").replace("_", "/"))
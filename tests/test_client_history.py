@@ -0,0 +1,84 @@
+"""客戶歷次評估紀錄與風險類型變動的批次偵測"""
+import pytest
+
+import client_history
+import results_store
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = client_history.ClientHistory(str(tmp_path / "history.db"))
+    yield history
+    history.pool.close()
+
+
+def _record(history, client_id, profile_index, timestamp=1767225600):
+    result = results_store.AssessmentResult((12, 10, 10, 17), profile_index, timestamp, 0)
+    return history.record(client_id, "token", result)
+
+
+def _changes(changes):
+    return [(change.client_id, change.from_profile_index, change.to_profile_index) for change in changes]
+
+
+def test_latest_and_trend(history):
+    assert history.latest("C1") is None
+    first = _record(history, "C1", 1)
+    second = _record(history, "C1", 3, timestamp=1767312000)
+    latest = history.latest("C1")
+    assert (latest.assessment_id, latest.profile_index, latest.previous_profile_index, latest.assessment_count) == (second, 3, 1, 2)
+    assert first < second
+
+    trend = history.trend("C1")
+    assert list(trend.columns) == ["評估時間", "財務狀況", "投資經驗", "投資目標", "風險心理承受度", "綜合得分", "風險類型"]
+    assert list(trend["風險類型"]) == [client_history.profile_name(1), client_history.profile_name(3)]
+    assert history.trend("C2").empty
+
+
+def test_detect_changes_scans_only_new_rows(history):
+    _record(history, "C1", 0)
+    _record(history, "C2", 1)
+    _record(history, "C1", 0)
+    _record(history, "C1", 2)
+    _record(history, "C2", 1)
+    assert _changes(history.detect_changes()) == [("C1", 0, 2)]
+    assert history.detect_changes() == []
+
+    _record(history, "C2", 3)
+    _record(history, "C1", 2)
+    _record(history, "C3", 4)
+    _record(history, "C1", 0)
+    assert _changes(history.detect_changes()) == [("C2", 1, 3), ("C1", 2, 0)]
+    assert history.detect_changes() == []
+
+    # 進度保存在資料庫中：另一個程序接著上次的位置掃描，不同的工作名稱各自從頭掃描
+    other = client_history.ClientHistory(history.path)
+    assert other.detect_changes() == []
+    assert _changes(other.detect_changes(job="audit", batch_size=2)) == [("C1", 0, 2), ("C2", 1, 3), ("C1", 2, 0)]
+    other.pool.close()
+
+
+def test_recent_changes(history):
+    _record(history, "C1", 0)
+    _record(history, "C1", 2)
+    _record(history, "C2", 1)
+    assert history.recent_changes() == []
+    _record(history, "C2", 4)
+    detected = history.detect_changes()
+    # 重複偵測（例如另一個工作名稱）不會重複記錄
+    history.detect_changes(job="audit")
+    recent = history.recent_changes()
+    assert recent == list(reversed(detected))
+    assert history.recent_changes(limit=1) == recent[:1]
+
+    frame = client_history.changes_frame(recent)
+    assert list(frame.columns) == ["客戶代號", "評估時間", "原風險類型", "新風險類型", "評估編號"]
+    assert list(frame["客戶代號"]) == ["C2", "C1"]
+    assert frame["新風險類型"][0] == client_history.profile_name(4)
+    assert client_history.changes_frame([]).empty
+
+
+def test_unopenable_database(tmp_path):
+    history = client_history.ClientHistory(str(tmp_path / "missing" / "history.db"))
+    with pytest.raises(client_history.DATABASE_ERRORS):
+        history.latest("C1")
@@ -0,0 +1,72 @@
+"""結果頁預先產生的分析摘要、總體結論與風險類型比較表"""
+import re
+
+import pytest
+
+import narratives
+import results_store
+
+# 原本結果頁逐項以 if/elif 判斷（< 40、< 70）的狀態與評估結果，依得分區間排列
+EXPECTED_ROWS = {
+    "財務狀況": [
+        ("需要改善", "財務基礎較薄弱，收入穩定性或緊急資金準備可能不足。"),
+        ("中等", "財務狀況中等，具備基本的財務穩定性，但仍有優化空間。"),
+        ("良好", "財務基礎穩健，具備良好的收入穩定性和適當的應急準備。"),
+    ],
+    "投資經驗": [
+        ("有限", "投資經驗較為有限，對投資工具和市場運作的了解可能不夠全面。"),
+        ("一般", "具有一定投資經驗，對基本投資工具有所了解，但深度可能有限。"),
+        ("豐富", "擁有豐富的投資經驗，對多種投資工具具備深入了解。"),
+    ],
+    "投資目標": [
+        ("保守短期", "投資目標偏向短期和保守，偏好保本和流動性高的投資選項。"),
+        ("平衡適中", "投資目標平衡，期望在適當風險下獲得中等回報。"),
+        ("成長導向", "投資目標偏向長期成長，願意承受短期波動以追求長期收益。"),
+    ],
+    "風險心理承受度": [
+        ("保守", "風險承受度較低，面對市場波動時可能傾向保守決策。"),
+        ("中等", "具有中等風險承受能力，能在一定程度上接受市場波動。"),
+        ("進取", "具有較高的風險承受能力，能夠面對較大市場波動並保持決策理性。"),
+    ],
+}
+CATEGORIES = list(EXPECTED_ROWS)
+
+
+@pytest.mark.parametrize("score, band", [
+    (0, 0), (39.99, 0), (40, 1), (55, 1), (69.99, 1), (70, 2), (100, 2),
+])
+def test_score_band_edges(score, band):
+    assert narratives.score_band(score) == band
+
+
+@pytest.mark.parametrize("scores, bands", [
+    ((39.99, 40, 69.99, 70), (0, 1, 1, 2)),
+    ((70, 69.99, 40, 39.99), (2, 1, 1, 0)),
+    ((0, 100, 40, 70), (0, 2, 1, 2)),
+])
+def test_summary_rows(scores, bands):
+    summary_df = narratives.lookup(0, (*scores, 50)).summary_df
+    assert list(summary_df.columns) == ["評估項目", "狀態", "評估結果"]
+    expected = [[category, *EXPECTED_ROWS[category][band]] for category, band in zip(CATEGORIES, bands)]
+    assert summary_df.values.tolist() == expected
+
+
+def test_all_combinations_precomputed():
+    assert len(narratives.NARRATIVES) == len(results_store.PROFILES) * 3 ** 4
+    for (_, bands), narrative in narratives.NARRATIVES.items():
+        assert list(narrative.summary_df["狀態"]) == [EXPECTED_ROWS[c][b][0] for c, b in zip(CATEGORIES, bands)]
+
+
+@pytest.mark.parametrize("profile_index", range(len(results_store.PROFILES)))
+def test_advice_and_comparison(profile_index):
+    profile = results_store.PROFILES[profile_index]
+    narrative = narratives.lookup(profile_index, (50, 50, 50, 50, 50))
+    assert f"border-left:5px solid {profile.color}" in narrative.advice_html
+    assert f"您屬於{profile.name}投資者" in narrative.advice_html
+
+    # 比較表只標示使用者的風險類型那一列
+    html = narrative.comparison_html
+    assert set(re.findall(r"_row(\d+)_col\d+[,\s]", html.split("</style>")[0])) == {str(profile_index)}
+    assert f"background-color: {profile.color}" in html
+    assert html.count("<tr>") == len(narratives.RISK_COMPARISON) + 1
+    assert list(narratives.RISK_COMPARISON["風險類型"]) == [p.name for p in results_store.PROFILES]
@@ -0,0 +1,122 @@
+"""評估結果的精簡表示、LRU 與閒置回收，以及回收後的重建"""
+from datetime import datetime
+
+import pytest
+
+import answer_token
+import results_store
+import scoring
+import state_backend
+from results_store import AssessmentResult, ResultCache
+
+ANSWERS = [
+    {key: options[:i % len(options)] if multi else options[i % len(options)] for key, options, multi in scoring.QUESTIONS}
+    for i in range(4)
+]
+
+
+def _token(i):
+    return answer_token.encode_token(ANSWERS[i], datetime(2026, 1, 1 + i))
+
+
+def _result(i):
+    return AssessmentResult.from_answers(ANSWERS[i], datetime(2026, 1, 1 + i))
+
+
+def _fields(result):
+    return result.points, result.profile_index, result.timestamp, result.packed_answers
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(results_store.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_result_fields():
+    result = _result(0)
+    assert result.scores == scoring.normalize_points(scoring.calculate_points(ANSWERS[0]))
+    assert result.risk_profile == scoring.classify(result.scores[4])[0]
+    assert result.answers == ANSWERS[0]
+    assert result.assessment_date == "2026-01-01 00:00:00"
+    assert _fields(AssessmentResult.from_token(_token(0))) == _fields(result)
+
+
+def test_record_round_trip():
+    result = _result(1)
+    data = result.to_bytes()
+    assert _fields(AssessmentResult.from_bytes(data)) == _fields(result)
+    with pytest.raises(ValueError, match="長度"):
+        AssessmentResult.from_bytes(data[:-1])
+    with pytest.raises(ValueError, match="版本"):
+        AssessmentResult.from_bytes(bytes([scoring.QUESTIONNAIRE_VERSION + 1]) + data[1:])
+
+
+def test_lru_eviction(clock):
+    cache = ResultCache(max_entries=2)
+    for i in range(3):
+        cache.put(_token(i), _result(i))
+    assert list(cache.entries) == [_token(1), _token(2)]
+    # 存取過的結果移到最後，下一次回收最久未使用的
+    cache.get(_token(1))
+    cache.put(_token(3), _result(3))
+    assert list(cache.entries) == [_token(1), _token(3)]
+    assert cache.stats() == {"entries": 2, "hits": 1, "misses": 0, "evictions": 2}
+
+
+def test_idle_eviction(clock):
+    cache = ResultCache(idle_seconds=60, sweep_interval=10)
+    cache.put(_token(0), _result(0))
+    clock[0] += 30
+    cache.put(_token(1), _result(1))
+    clock[0] += 35
+    cache.get(_token(1))
+    # 第一筆已閒置 65 秒，第二筆剛被存取
+    assert list(cache.entries) == [_token(1)]
+    assert cache.evictions == 1
+
+    # 兩次掃描之間不回收
+    clock[0] += 65
+    cache.put(_token(2), _result(2))
+    assert len(cache) == 1
+    assert cache.evictions == 2
+    clock[0] += 5
+    cache.put(_token(3), _result(3))
+    assert list(cache.entries) == [_token(2), _token(3)]
+
+
+def test_rebuild_from_token_after_eviction():
+    cache = ResultCache(max_entries=1, idle_seconds=0, sweep_interval=0)
+    cache.put(_token(0), _result(0))
+    assert len(cache) == 0
+    assert _fields(cache.get(_token(0))) == _fields(_result(0))
+    assert cache.stats() == {"entries": 0, "hits": 0, "misses": 1, "evictions": 2}
+    with pytest.raises(ValueError):
+        cache.get("not-a-token")
+
+
+def test_restore_from_shared_store_after_eviction(tmp_path):
+    store = state_backend.StateStore(state_backend.SQLiteBackend(str(tmp_path / "state.db")))
+    cache = ResultCache(max_entries=1, store=store)
+    # 共用後端中的結果優先於由代碼重建
+    shared = AssessmentResult((1, 2, 3, 4), 2, 1767225600, 0)
+    cache.put(_token(0), shared)
+    cache.put(_token(1), _result(1))
+    assert list(cache.entries) == [_token(1)]
+    assert _fields(cache.get(_token(0))) == _fields(shared)
+    assert store.stats()["backend_hits"] == 1
+    # 結果只寫入共用後端，不佔用程序內快取
+    assert store.stats()["local_entries"] == 0
+
+    # 無法解析的記錄改由代碼重建，並覆寫共用後端中的記錄
+    store.set(f"result:{_token(2)}", b"broken", local=False)
+    assert _fields(cache.get(_token(2))) == _fields(_result(2))
+    assert store.get(f"result:{_token(2)}", local=False) == _result(2).to_bytes()
+
+
+def test_memory_store_is_not_written():
+    store = state_backend.StateStore()
+    cache = ResultCache(store=store)
+    cache.put(_token(0), _result(0))
+    assert store.stats()["local_entries"] == 0
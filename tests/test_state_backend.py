@@ -0,0 +1,260 @@
+"""共用狀態後端：RESP 協定、連線池、SQLite 與程序內快取的分層"""
+import io
+import socket
+import threading
+import time
+
+import pytest
+
+import state_backend
+from state_backend import BackendError, ConnectionPool, RedisBackend, SQLiteBackend, StateStore
+from tools import resp_server
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = resp_server.start(port=0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def redis(server):
+    backend = RedisBackend(port=server.server_address[1], max_connections=2, timeout=1.0)
+    backend._command("FLUSHDB")
+    yield backend
+    backend.pool.close()
+
+
+def _reply_reader(data):
+    """以固定的位元組取代 socket，只測試回應的解析"""
+    conn = object.__new__(state_backend._RespConnection)
+    conn.reader = io.BytesIO(data)
+    return conn
+
+
+def _closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("data, reply", [
+    (b"+OK\r\n", "OK"),
+    (b":42\r\n", 42),
+    (b"$5\r\nhello\r\n", b"hello"),
+    (b"$0\r\n\r\n", b""),
+    (b"$-1\r\n", None),
+    (b"*-1\r\n", None),
+    (b"*3\r\n$3\r\nfoo\r\n:5\r\n$-1\r\n", [b"foo", 5, None]),
+])
+def test_resp_reply_parsing(data, reply):
+    assert _reply_reader(data)._read_reply() == reply
+
+
+def test_resp_error_reply():
+    with pytest.raises(BackendError, match="ERR wrong"):
+        _reply_reader(b"-ERR wrong type\r\n")._read_reply()
+    with pytest.raises(BackendError):
+        _reply_reader(b"?what\r\n")._read_reply()
+
+
+@pytest.mark.parametrize("data", [b"", b"+OK", b"$5\r\nhel"])
+def test_resp_truncated_reply(data):
+    with pytest.raises(ConnectionError):
+        _reply_reader(data)._read_reply()
+
+
+def test_redis_commands(redis):
+    assert redis.ping()
+    assert redis.get("missing") is None
+    redis.set("key", b"\x00binary\r\n")
+    assert redis.get("key") == b"\x00binary\r\n"
+    redis.set("expiring", "value", ttl=60)
+    assert 0 < redis._command("TTL", "expiring") <= 60
+    redis.delete("key")
+    assert redis.get("key") is None
+    with pytest.raises(BackendError, match="unknown command"):
+        redis._command("HGET", "key", "field")
+    # 伺服器錯誤不影響連線，連線仍可重複使用
+    assert redis.ping()
+    assert redis.pool.stats()["created"] == 1
+
+
+def test_redis_retries_dropped_idle_connection(redis):
+    redis.set("key", b"value")
+    # 伺服器關閉閒置連線（例如重新啟動），下一個指令以新連線重試
+    idle = redis.pool._idle[-1]
+    assert idle.command("QUIT") == "OK"
+    assert redis.get("key") == b"value"
+    assert redis.pool.stats() == {"idle": 1, "created": 2, "max": 2}
+
+
+def test_pool_limits_and_reuse():
+    pool = ConnectionPool(FakeConnection, max_connections=2, timeout=0.05)
+    first, second = pool.acquire(), pool.acquire()
+    with pytest.raises(BackendError, match="連線池已滿"):
+        pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    pool.release(first)
+    pool.release(second, broken=True)
+    assert second.closed
+    assert pool.stats() == {"idle": 1, "created": 2, "max": 2}
+
+
+def test_pool_connection_closes_on_error():
+    pool = ConnectionPool(FakeConnection, max_connections=1, timeout=0.05)
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            raise RuntimeError("boom")
+    assert conn.closed
+    assert pool.stats()["idle"] == 0
+    # 關閉的連線會釋放名額
+    with pool.connection() as conn:
+        pass
+    assert not conn.closed
+    assert pool.stats() == {"idle": 1, "created": 2, "max": 1}
+
+
+def test_pool_connect_failure_releases_slot():
+    def connect():
+        raise OSError("refused")
+
+    pool = ConnectionPool(connect, max_connections=1, timeout=0.05)
+    for _ in range(3):
+        with pytest.raises(OSError):
+            pool.acquire()
+
+
+def test_store_local_and_backend_tiers(redis):
+    store = StateStore(redis)
+    store.set("pdf:a", b"report")
+    assert store.get("pdf:a") == b"report"
+    assert store.stats()["local_hits"] == 1
+
+    # 另一個程序的 StateStore：先由共用後端取得，之後由程序內快取回應
+    other = StateStore(redis)
+    assert other.get("pdf:a") == b"report"
+    assert other.get("pdf:a") == b"report"
+    stats = other.stats()
+    assert (stats["backend_hits"], stats["local_hits"], stats["local_entries"]) == (1, 1, 1)
+    assert other.get("pdf:missing") is None
+    assert other.stats()["misses"] == 1
+
+
+def test_store_local_false_bypasses_local_tier(redis):
+    store = StateStore(redis)
+    store.set("result:a", b"record", local=False)
+    assert store.get("result:a", local=False) == b"record"
+    assert store.stats()["local_entries"] == 0
+    assert redis.get("result:a") == b"record"
+
+
+def test_store_without_backend():
+    store = StateStore()
+    assert not store.shared
+    assert store.get_or_create("figure", lambda: b"json") == b"json"
+    assert store.get_or_create("figure", lambda: pytest.fail("不應重新產生")) == b"json"
+    store.set("result:a", b"record", local=False)
+    assert store.get("result:a", local=False) is None
+
+
+def test_store_local_byte_limit():
+    value = bytes(100)
+    entry_size = StateStore._entry_size("k0", value)
+    store = StateStore(local_bytes=entry_size * 3)
+    for i in range(5):
+        store.set(f"k{i}", value)
+    assert list(store.local) == ["k2", "k3", "k4"]
+    assert store.local_size == entry_size * 3
+    # 存取過的項目移到最後，下一次回收最舊的
+    store.get("k2")
+    store.set("k5", value)
+    assert list(store.local) == ["k4", "k2", "k5"]
+    # 超過容量的單一項目不放進程序內快取
+    store.set("huge", bytes(entry_size * 4))
+    assert "huge" not in store.local
+
+
+def test_store_falls_back_when_backend_is_down():
+    store = StateStore(RedisBackend(port=_closed_port(), timeout=0.2), retry_seconds=60)
+    store.set("pdf:a", b"report")
+    assert store.get("pdf:a") == b"report"
+    assert store.get("pdf:missing") is None
+    stats = store.stats()
+    # 失敗後在 retry_seconds 內不再嘗試連線
+    assert (stats["backend_errors"], stats["backend_down"]) == (1, True)
+
+    store.retry_seconds = 0
+    store.down_until = 0.0
+    assert store.get("pdf:missing") is None
+    assert store.stats()["backend_errors"] == 2
+
+
+def test_sqlite_backend(tmp_path):
+    backend = state_backend.backend_from_url(f"sqlite:///{tmp_path}/state.db?max_connections=2&timeout=0.5")
+    assert isinstance(backend, SQLiteBackend)
+    assert backend.path == f"{tmp_path}/state.db"
+    assert backend.ping()
+    backend.set("key", b"value")
+    assert backend.get("key") == b"value"
+    backend.set("key", b"replaced")
+    assert backend.get("key") == b"replaced"
+    backend.delete("key")
+    assert backend.get("key") is None
+    backend.set("expiring", b"value", ttl=0.05)
+    time.sleep(0.1)
+    assert backend.get("expiring") is None
+
+    # 每次重新執行腳本可能換一個執行緒，連線仍由連線池重複使用
+    def run():
+        backend.set("thread", b"value")
+        assert backend.get("thread") == b"value"
+
+    for _ in range(5):
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+    assert backend.pool.stats() == {"idle": 1, "created": 1, "max": 2}
+
+    # 另一個程序以同一個檔案共用資料
+    assert SQLiteBackend(backend.path).get("thread") == b"value"
+
+
+def test_sqlite_backend_unopenable_path(tmp_path):
+    # 建立時不開啟檔案；存取失敗時改用程序內快取
+    backend = SQLiteBackend(str(tmp_path / "missing" / "state.db"))
+    store = StateStore(backend, retry_seconds=60)
+    store.set("pdf:a", b"report")
+    assert store.get("pdf:a") == b"report"
+    assert store.stats()["backend_errors"] == 1
+    assert store.stats()["backend_down"]
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("", None),
+    ("memory://", None),
+    ("redis://:p%40ss@cache:6380/2?max_connections=3", ("cache", 6380, 2, "p@ss", 3)),
+])
+def test_backend_from_url(url, expected):
+    backend = state_backend.backend_from_url(url)
+    if expected is None:
+        assert backend is None
+    else:
+        assert (backend.host, backend.port, backend.db, backend.password, backend.pool.max_connections) == expected
+
+
+@pytest.mark.parametrize("url", ["sqlite://", "mysql://db/state"])
+def test_backend_from_url_rejects(url):
+    with pytest.raises(ValueError):
+        state_backend.backend_from_url(url)
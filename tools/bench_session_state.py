@@ -0,0 +1,144 @@
+"""
+會話狀態記憶體基準測試
+
+比較每 1000 個已完成評估的工作階段所佔用的記憶體：
+- legacy：舊版的 user_answers（20 個中文鍵的字串字典）與 results 字典
+- compact：會話狀態只存結果代碼，完整結果以 AssessmentResult 存放於共用快取
+- evicted：結果寫入快取後因閒置而被 ResultCache 回收，工作階段只留下結果代碼
+
+每個情境在獨立的子程序中執行；RSS 增量與 tracemalloc 分配量分開量測，
+避免 tracemalloc 本身的記錄影響 RSS。
+
+用法:
+    python tools/bench_session_state.py --sessions 10000
+"""
+import argparse
+import gc
+import json
+import random
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import answer_token  # noqa: E402
+import results_store  # noqa: E402
+import scoring  # noqa: E402
+
+SCENARIOS = ["legacy", "compact", "evicted"]
+
+
+def _rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _random_answers(rng):
+    return {
+        key: rng.sample(options, rng.randint(0, len(options))) if multi else rng.choice(options)
+        for key, options, multi in scoring.QUESTIONS
+    }
+
+
+def _legacy_results(answers, assessment_date):
+    """舊版存放在會話狀態中的 results 字典"""
+    financial_score, experience_score, goal_score, psychology_score, final_score = scoring.normalize_points(
+        scoring.calculate_points(answers)
+    )
+    risk_profile, description, color = scoring.classify(final_score)
+    return {
+        "financial_score": financial_score,
+        "experience_score": experience_score,
+        "goal_score": goal_score,
+        "psychology_score": psychology_score,
+        "final_score": final_score,
+        "risk_profile": risk_profile,
+        "description": description,
+        "color": color,
+        "assessment_date": assessment_date.strftime(scoring.DATE_FORMAT)
+    }
+
+
+def _build_sessions(scenario, inputs):
+    sessions = []
+    for answers, assessment_date in inputs:
+        if scenario == "legacy":
+            sessions.append({
+                "assessment_complete": True,
+                "user_answers": scoring.format_answers(answers),
+                "results": _legacy_results(answers, assessment_date),
+            })
+        else:
+            token = answer_token.encode_token(answers, assessment_date)
+            results_store.RESULTS.put(token, results_store.AssessmentResult.from_answers(answers, assessment_date))
+            sessions.append({"assessment_complete": True, "result_token": token})
+    return sessions
+
+
+def measure(scenario, n_sessions, trace=False, seed=0):
+    """在目前程序中建立 n_sessions 個工作階段，回傳每 1000 個工作階段的記憶體增量 (KB)"""
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    inputs = [(_random_answers(rng), start + timedelta(seconds=i)) for i in range(n_sessions)]
+    results_store.RESULTS.max_entries = n_sessions
+    if scenario == "evicted":
+        # 每次寫入都回收所有閒置的結果，模擬工作階段閒置超過 RISK_APP_RESULT_IDLE_SECONDS
+        results_store.RESULTS.idle_seconds = 0
+        results_store.RESULTS.sweep_interval = 0
+
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+        sessions = _build_sessions(scenario, inputs)
+        used_kb = tracemalloc.get_traced_memory()[0] / 1024
+        tracemalloc.stop()
+    else:
+        rss_before = _rss_kb()
+        sessions = _build_sessions(scenario, inputs)
+        gc.collect()
+        used_kb = _rss_kb() - rss_before
+    assert len(sessions) == n_sessions
+    if scenario == "evicted":
+        assert len(results_store.RESULTS) == 0
+    return round(used_kb * 1000 / n_sessions, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="每 1000 個工作階段的會話狀態記憶體用量")
+    parser.add_argument("--sessions", type=int, default=10000, help="每個情境建立的工作階段數")
+    parser.add_argument("--scenario", choices=SCENARIOS, help="只在目前程序中量測單一情境（內部使用）")
+    parser.add_argument("--trace", action="store_true", help="以 tracemalloc 量測（內部使用）")
+    parser.add_argument("--output", help="結果輸出路徑 (JSON)")
+    args = parser.parse_args(argv)
+
+    if args.scenario:
+        print(json.dumps(measure(args.scenario, args.sessions, trace=args.trace)))
+        return 0
+
+    def run(scenario, trace):
+        command = [sys.executable, __file__, "--scenario", scenario, "--sessions", str(args.sessions)]
+        if trace:
+            command.append("--trace")
+        return json.loads(subprocess.run(command, capture_output=True, text=True, check=True).stdout)
+
+    rows = [
+        {"scenario": scenario, "rss_kb_per_1000": run(scenario, False), "traced_kb_per_1000": run(scenario, True)}
+        for scenario in SCENARIOS
+    ]
+    print(f"{'scenario':<10}{'RSS KB/1000':>14}{'traced KB/1000':>17}")
+    for row in rows:
+        print(f"{row['scenario']:<10}{row['rss_kb_per_1000']:>14}{row['traced_kb_per_1000']:>17}")
+    if args.output:
+        Path(args.output).write_text(json.dumps({"sessions": args.sessions, "results": rows}, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
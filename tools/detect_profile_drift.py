@@ -0,0 +1,43 @@
+"""
+批次偵測客戶風險類型變動
+
+掃描上次執行後新增的評估，列出風險類型與該客戶上一次評估不同的客戶。
+進度保存在歷史資料庫的 job_cursors 表中，重複執行只會處理新的評估。
+
+用法:
+    python tools/detect_profile_drift.py
+    python tools/detect_profile_drift.py --db /var/lib/risk-app/history.db --output changes.csv
+"""
+import argparse
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import client_history  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="偵測風險類型與上次評估不同的客戶")
+    parser.add_argument("--db", default=client_history.HISTORY_DB, help="歷史資料庫路徑（預設 RISK_APP_HISTORY_DB）")
+    parser.add_argument("--job", default="profile_drift", help="進度名稱；不同名稱各自保留掃描進度")
+    parser.add_argument("--output", help="將本次偵測到的變動寫入 CSV")
+    args = parser.parse_args(argv)
+
+    changes = client_history.ClientHistory(args.db).detect_changes(job=args.job)
+    df = client_history.changes_frame(changes)
+    if df.empty:
+        print("沒有新的風險類型變動")
+    else:
+        # 同一位客戶在本次掃描範圍內變動多次時，只列出最後一次
+        latest = df.drop_duplicates("客戶代號", keep="last")
+        print(f"{len(latest)} 位客戶的風險類型變動（共 {len(df)} 筆評估）")
+        print(latest.to_string(index=False))
+    if args.output:
+        df.to_csv(args.output, index=False, encoding="utf-8-sig")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
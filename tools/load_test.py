@@ -0,0 +1,378 @@
+"""
+並行工作階段壓力測試工具
+
+在本機以 Streamlit AppTest 模擬 N 個同時在線的使用者：每個工作階段填寫 20 題的
+risk_assessment_form 並提交，接著操作結果頁的互動元件，最後按下「重新進行評估」。
+工具會記錄每次重新執行 (rerun) 的延遲百分位數、腳本執行次數、CPU 時間與 RSS 成長，
+並輸出可在不同版本間比對的 JSON 報告。
+
+用法:
+    python tools/load_test.py --sessions 50 --concurrency 10 --output report.json
+    python tools/load_test.py --sessions 50 --concurrency 10 --compare old_report.json
+
+注意：
+- 展開器 (expander) 的開合只在瀏覽器端處理，不會觸發 rerun，因此不在量測範圍內。
+- AppTest 會把 fragment 內元件的變動當作完整的 rerun 執行，因此結果頁互動的延遲是上限值。
+- AppTest 並非完全執行緒安全，高並行度下偶爾會有工作階段失敗；失敗會另外計入 errors。
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from streamlit.logger import set_log_level
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import ScriptRunnerEvent
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import app_test as app_test_module
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_APP = REPO_ROOT / "app.py"
+PERCENTILES = [50, 90, 95, 99]
+
+
+class _ScriptRunCounter:
+    """統計 AppTest 內部的腳本執行次數（完整執行與 fragment 執行分開計算）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.full = 0
+        self.fragment = 0
+
+    def record(self, sender, event, **kwargs):
+        if event != ScriptRunnerEvent.SCRIPT_STARTED:
+            return
+        with self.lock:
+            if kwargs.get("fragment_ids_this_run"):
+                self.fragment += 1
+            else:
+                self.full += 1
+
+    def snapshot(self):
+        with self.lock:
+            return self.full, self.fragment
+
+
+SCRIPT_RUNS = _ScriptRunCounter()
+
+
+class _CountingScriptRunner(LocalScriptRunner):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_event.connect(SCRIPT_RUNS.record, weak=False)
+
+
+def _install_run_counter():
+    app_test_module.LocalScriptRunner = _CountingScriptRunner
+
+
+def _install_shared_runtime():
+    """
+    AppTest 每次執行時設定並在結束時清除全域的 Runtime 實例，多個工作階段並行時
+    會互相清掉對方仍在使用的實例；這裡讓清除後仍能取得最近一次建立的實例。
+    """
+    if getattr(Runtime, "_load_test_patched", False):
+        return
+    original = Runtime.instance.__func__
+    last = [None]
+
+    def instance(cls):
+        if cls._instance is not None:
+            last[0] = cls._instance
+            return cls._instance
+        if last[0] is not None:
+            return last[0]
+        return original(cls)
+
+    def exists(cls):
+        return cls._instance is not None or last[0] is not None
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+    Runtime._load_test_patched = True
+
+
+def _rss_mb():
+    """讀取目前程序的常駐記憶體 (MB)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _latency_stats(samples):
+    stats = {"count": len(samples)}
+    if samples:
+        stats["mean"] = sum(samples) / len(samples)
+        for pct in PERCENTILES:
+            stats[f"p{pct}"] = _percentile(samples, pct)
+        stats["max"] = max(samples)
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in stats.items()}
+
+
+def _find_button(at, label):
+    for button in at.button:
+        if button.label == label:
+            return button
+    raise LookupError(f"找不到按鈕: {label}")
+
+
+class SessionSimulator:
+    """模擬單一使用者從填寫問卷到重新評估的完整流程"""
+
+    def __init__(self, app_path, seed, timeout, interactions):
+        self.app_path = str(app_path)
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+        self.interactions = interactions
+        self.latencies = []  # (步驟, 毫秒)
+        self.at = None
+
+    def _timed(self, step, action):
+        start = time.perf_counter()
+        at = action()
+        self.latencies.append((step, (time.perf_counter() - start) * 1000))
+        if at.exception:
+            raise RuntimeError(f"{step}: {at.exception[0].message}")
+        return at
+
+    def fill_form(self):
+        for radio in self.at.radio:
+            radio.set_value(self.rng.choice(radio.options))
+        for multiselect in self.at.multiselect:
+            k = self.rng.randint(0, len(multiselect.options))
+            multiselect.set_value(self.rng.sample(list(multiselect.options), k))
+
+    def interact_results(self):
+        for _ in range(self.interactions):
+            if not self.at.slider:
+                break
+            slider = self.rng.choice(list(self.at.slider))
+            low, high = slider.min, slider.max
+            step = slider.step or 1
+            slider.set_value(low + step * self.rng.randint(0, int((high - low) / step)))
+            self._timed("interact", self.at.run)
+
+    def run(self):
+        self.at = AppTest.from_file(self.app_path, default_timeout=self.timeout)
+        self._timed("initial", self.at.run)
+        self.fill_form()
+        self._timed("submit", _find_button(self.at, "提交問卷").click().run)
+        if not self.at.session_state["assessment_complete"]:
+            raise RuntimeError("submit: 提交後未顯示評估結果")
+        self.interact_results()
+        self._timed("reset", _find_button(self.at, "重新進行評估").click().run)
+        return self
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _package_versions():
+    from importlib.metadata import PackageNotFoundError, version
+    versions = {}
+    for name in ["streamlit", "plotly", "fpdf2", "pandas", "numpy"]:
+        try:
+            versions[name] = version(name)
+        except PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def run_load_test(app_path=DEFAULT_APP, sessions=20, concurrency=5, interactions=2,
+                  warmup=1, seed=0, timeout=60, keep_sessions=True):
+    """執行壓力測試並回傳報告字典"""
+    _install_run_counter()
+    _install_shared_runtime()
+
+    # 預熱：排除首次匯入與編譯的成本
+    for i in range(warmup):
+        SessionSimulator(app_path, seed=-1 - i, timeout=timeout, interactions=interactions).run()
+
+    full_before, fragment_before = SCRIPT_RUNS.snapshot()
+    rss_start = _rss_mb()
+    rss_peak = rss_start
+    rss_lock = threading.Lock()
+    errors = []
+
+    def worker(index):
+        nonlocal rss_peak
+        simulator = SessionSimulator(app_path, seed=seed + index, timeout=timeout, interactions=interactions)
+        try:
+            simulator.run()
+        except Exception as e:
+            errors.append(f"session {index}: {e}")
+        if not keep_sessions:
+            # 預設保留 AppTest 物件以模擬仍開著的分頁
+            simulator.at = None
+        rss = _rss_mb()
+        with rss_lock:
+            rss_peak = max(rss_peak, rss)
+        return simulator
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        simulators = list(executor.map(worker, range(sessions)))
+    wall_seconds = time.perf_counter() - wall_start
+    cpu_seconds = time.process_time() - cpu_start
+    rss_end = _rss_mb()
+    full_runs, fragment_runs = SCRIPT_RUNS.snapshot()
+    full_runs -= full_before
+    fragment_runs -= fragment_before
+
+    by_step = {}
+    for simulator in simulators:
+        for step, latency in simulator.latencies:
+            by_step.setdefault(step, []).append(latency)
+    all_latencies = [latency for samples in by_step.values() for latency in samples]
+    completed = sessions - len(errors)
+
+    return {
+        "meta": {
+            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "packages": _package_versions(),
+        },
+        "params": {
+            "app": str(app_path),
+            "sessions": sessions,
+            "concurrency": concurrency,
+            "interactions": interactions,
+            "warmup": warmup,
+            "seed": seed,
+            "keep_sessions": keep_sessions,
+        },
+        "summary": {
+            "completed_sessions": completed,
+            "errors": len(errors),
+            "wall_seconds": round(wall_seconds, 3),
+            "throughput_sessions_per_second": round(sessions / wall_seconds, 3),
+            "cpu_seconds": round(cpu_seconds, 3),
+            "cpu_seconds_per_assessment": round(cpu_seconds / max(completed, 1), 4),
+            "script_runs_full": full_runs,
+            "script_runs_fragment": fragment_runs,
+            "script_runs_per_assessment": round((full_runs + fragment_runs) / max(completed, 1), 2),
+            "rss_mb_start": round(rss_start, 1),
+            "rss_mb_peak": round(rss_peak, 1),
+            "rss_mb_end": round(rss_end, 1),
+            "rss_mb_growth": round(rss_end - rss_start, 1),
+            "rss_kb_per_session": round((rss_end - rss_start) * 1024 / sessions, 1),
+        },
+        "latency_ms": {
+            "all": _latency_stats(all_latencies),
+            **{step: _latency_stats(samples) for step, samples in sorted(by_step.items())},
+        },
+        "error_messages": errors[:20],
+    }
+
+
+def _flatten(report, prefix=""):
+    flat = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare_reports(old, new):
+    """比較兩份報告中的數值指標，回傳 (指標, 舊值, 新值, 變化%) 列表"""
+    old_flat = _flatten({k: old.get(k, {}) for k in ("summary", "latency_ms")})
+    new_flat = _flatten({k: new.get(k, {}) for k in ("summary", "latency_ms")})
+    rows = []
+    for key in sorted(set(old_flat) | set(new_flat)):
+        before, after = old_flat.get(key), new_flat.get(key)
+        change = None
+        if before not in (None, 0) and after is not None:
+            change = (after - before) / abs(before) * 100
+        rows.append((key, before, after, change))
+    return rows
+
+
+def _print_comparison(rows):
+    print(f"{'metric':<45}{'old':>14}{'new':>14}{'change':>10}")
+    for key, before, after, change in rows:
+        change_text = "" if change is None else f"{change:+.1f}%"
+        print(f"{key:<45}{str(before):>14}{str(after):>14}{change_text:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="投資風險評估 App 的並行工作階段壓力測試")
+    parser.add_argument("--app", default=str(DEFAULT_APP), help="Streamlit 腳本路徑")
+    parser.add_argument("--sessions", type=int, default=20, help="模擬的工作階段總數")
+    parser.add_argument("--concurrency", type=int, default=5, help="同時執行的工作階段數")
+    parser.add_argument("--interactions", type=int, default=2, help="每個工作階段在結果頁的互動次數")
+    parser.add_argument("--warmup", type=int, default=1, help="不計入統計的預熱工作階段數")
+    parser.add_argument("--seed", type=int, default=0, help="隨機作答的種子")
+    parser.add_argument("--timeout", type=float, default=60, help="單次 rerun 的逾時秒數")
+    parser.add_argument("--close-sessions", action="store_true", help="工作階段結束後即釋放，不模擬開著的分頁")
+    parser.add_argument("--output", help="報告輸出路徑 (JSON)")
+    parser.add_argument("--compare", help="與先前的報告比較")
+    args = parser.parse_args(argv)
+
+    # 壓測時不需要 Streamlit 的日誌與棄用警告
+    set_log_level("error")
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+    report = run_load_test(
+        app_path=args.app,
+        sessions=args.sessions,
+        concurrency=args.concurrency,
+        interactions=args.interactions,
+        warmup=args.warmup,
+        seed=args.seed,
+        timeout=args.timeout,
+        keep_sessions=not args.close_sessions,
+    )
+    text = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    if args.compare:
+        old = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        _print_comparison(compare_reports(old, report))
+
+    return 1 if report["summary"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+本機 Redis 協定 (RESP) 測試伺服器
+
+在沒有 Redis 的環境中測試 redis:// 狀態後端用，只實作應用程式與測試會用到的指令：
+PING、ECHO、AUTH、SELECT、GET、SET（EX/PX/NX/XX）、DEL、EXISTS、EXPIRE、TTL、
+DBSIZE、FLUSHDB、QUIT。資料只存在記憶體中，不會寫入磁碟。
+
+用法:
+    python tools/resp_server.py --port 6399
+    RISK_APP_STATE_BACKEND=redis://127.0.0.1:6399/0 streamlit run app.py
+"""
+import argparse
+import socketserver
+import sys
+import threading
+import time
+
+
+class RespError(Exception):
+    pass
+
+
+class Database:
+    """依資料庫編號分開的鍵值資料與到期時間"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}  # (db, key) -> (value, expires_at)
+
+    def _live(self, db, key, now):
+        entry = self.data.get((db, key))
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self.data[(db, key)]
+            return None
+        return entry
+
+    def execute(self, db, name, args):
+        now = time.monotonic()
+        with self.lock:
+            if name == "GET":
+                entry = self._live(db, args[0], now)
+                return None if entry is None else entry[0]
+            if name == "SET":
+                key, value, expires_at = args[0], args[1], None
+                options = [arg.upper() for arg in args[2:]]
+                i = 0
+                while i < len(options):
+                    if options[i] in (b"EX", b"PX") and i + 1 < len(options):
+                        amount = int(options[i + 1])
+                        expires_at = now + (amount if options[i] == b"EX" else amount / 1000)
+                        i += 2
+                    elif options[i] in (b"NX", b"XX"):
+                        exists = self._live(db, key, now) is not None
+                        if (options[i] == b"NX") == exists:
+                            return None
+                        i += 1
+                    else:
+                        raise RespError("ERR syntax error")
+                self.data[(db, key)] = (value, expires_at)
+                return "OK"
+            if name == "DEL":
+                removed = 0
+                for key in args:
+                    if self._live(db, key, now) is not None:
+                        del self.data[(db, key)]
+                        removed += 1
+                return removed
+            if name == "EXISTS":
+                return sum(self._live(db, key, now) is not None for key in args)
+            if name == "EXPIRE":
+                entry = self._live(db, args[0], now)
+                if entry is None:
+                    return 0
+                self.data[(db, args[0])] = (entry[0], now + int(args[1]))
+                return 1
+            if name == "TTL":
+                entry = self._live(db, args[0], now)
+                if entry is None:
+                    return -2
+                return -1 if entry[1] is None else int(entry[1] - now)
+            if name == "DBSIZE":
+                return sum(1 for (d, key) in list(self.data) if d == db and self._live(d, key, now) is not None)
+            if name == "FLUSHDB":
+                for d, key in [k for k in self.data if k[0] == db]:
+                    del self.data[(d, key)]
+                return "OK"
+        raise RespError(f"ERR unknown command '{name}'")
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.db = 0
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # 行內指令（例如 telnet 輸入的 PING）
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            header = self.rfile.readline()
+            if not header.startswith(b"$"):
+                raise RespError("ERR Protocol error")
+            args.append(self.rfile.read(int(header[1:]) + 2)[:-2])
+        return args
+
+    def _write(self, reply):
+        if reply is None:
+            data = b"$-1\r\n"
+        elif isinstance(reply, RespError):
+            data = b"-" + str(reply).encode("utf-8") + b"\r\n"
+        elif isinstance(reply, int):
+            data = b":%d\r\n" % reply
+        elif isinstance(reply, str):
+            data = b"+" + reply.encode("utf-8") + b"\r\n"
+        else:
+            data = b"$%d\r\n%s\r\n" % (len(reply), reply)
+        self.wfile.write(data)
+
+    def handle(self):
+        database = self.server.database
+        while True:
+            try:
+                command = self._read_command()
+            except (RespError, ValueError):
+                self._write(RespError("ERR Protocol error"))
+                return
+            if command is None:
+                return
+            if not command:
+                continue
+            name, args = command[0].decode("utf-8", "replace").upper(), command[1:]
+            try:
+                if name == "QUIT":
+                    self._write("OK")
+                    return
+                if name == "PING":
+                    reply = args[0] if args else "PONG"
+                elif name == "ECHO":
+                    reply = args[0]
+                elif name == "AUTH":
+                    reply = "OK"
+                elif name == "SELECT":
+                    self.db = int(args[0])
+                    reply = "OK"
+                else:
+                    reply = database.execute(self.db, name, args)
+            except RespError as e:
+                reply = e
+            except (IndexError, ValueError):
+                reply = RespError(f"ERR wrong arguments for '{name.lower()}' command")
+            self._write(reply)
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, RespHandler)
+        self.database = Database()
+
+
+def start(host="127.0.0.1", port=0):
+    """在背景執行緒啟動伺服器，回傳 RespServer（port=0 時由系統指定，見 server_address）"""
+    server = RespServer((host, port))
+    threading.Thread(target=server.serve_forever, name="resp-server", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本機 Redis 協定測試伺服器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args(argv)
+    server = RespServer((args.host, args.port))
+    print(f"listening on redis://{args.host}:{server.server_address[1]}/0")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())